@@ -1,11 +1,11 @@
 __author__ = 'Pedro Sequeira'
 
 import gym
-from gym.wrappers import Monitor
 from os import makedirs
 from os.path import exists
 from frogger import FroggerState, CELL_WIDTH, CELL_HEIGHT
 from frogger.gym import *
+from frogger.recorder import FrameRecorder, PNG_FORMAT
 
 GYM_ENV_ID = 'Custom-Frogger-v0'
 
@@ -13,7 +13,7 @@ GYM_ENV_ID = 'Custom-Frogger-v0'
 register(
     id=GYM_ENV_ID,
     kwargs={MAX_STEPS_ATTR: DEFAULT_MAX_STEPS, LIVES_ATTR: DEFAULT_LIVES, FPS_ATTR: 4, FORCE_FPS_ATTR: False,
-            SOUND_ATTR: False, DISPLAY_SCREEN_ATTR: False},
+            SOUND_ATTR: False, DISPLAY_SCREEN_ATTR: False, OBS_TYPE_ATTR: RECTS_OBS_TYPE},
     entry_point=FROGGER_ENTRY_POINT_STR,
     tags={MAX_EPISODE_STEPS_ATTR: DEFAULT_MAX_STEPS * DEFAULT_LIVES},
     nondeterministic=False,
@@ -26,16 +26,15 @@ def clean_console():
 
 if __name__ == '__main__':
 
-    env = gym.make(GYM_ENV_ID)
     out_dir = 'results_gym_frogger'
     if not exists(out_dir):
         makedirs(out_dir)
 
-    env = Monitor(env, directory=out_dir, force=True, video_callable=lambda _: True)
+    # records the frames of all game ticks from a background thread
+    env = gym.make(GYM_ENV_ID, recorder=FrameRecorder(out_dir, format=PNG_FORMAT))
     env.seed(0)
-    env.env.env.monitor = env
 
-    action_names = list(env.env.env.game_state.game.actions.keys())
+    action_names = list(env.unwrapped.game_state.game.actions.keys())
 
     episode_count = 100
     reward = 0
@@ -1,6 +1,7 @@
 __author__ = 'Pedro Sequeira'
 
 import numpy as np
+from collections import OrderedDict
 from pygame.constants import K_UP, K_DOWN, K_LEFT, K_RIGHT
 
 # constants
@@ -25,6 +26,16 @@ CARS_INIT_TICKS = [40, 30, 40, 30, 50]
 CARS_SPEED_FACTORS = [1, 2, 2, 1, 1]
 MAX_CAR_TICKS = 60
 MAX_LOG_TICK = 30
+CARS_SIZES = [(55, 30), (58, 30), (80, 30), (68, 30), (56, 30)]
+LOG_SIZE = (99, 33)
+FROG_SHEET_SIZE = (120, 30)
+ARRIVED_FROG_SIZE = (30, 30)
+DEATH_IMAGE_SIZE = (40, 40)
+CARS_MIN_X = -80
+CARS_MAX_X = 516
+LOGS_MIN_X = -100
+LOGS_MAX_X = 448
+NUM_LANES = 5
 ACTION_UP_KEY = K_UP
 ACTION_DOWN_KEY = K_DOWN
 ACTION_LEFT_KEY = K_LEFT
@@ -49,6 +60,198 @@ CAR_DEATH_IDX = 2
 TIME_UP_DEATH_IDX = 3
 
 OBS_SEPARATOR = 9876.54321
+OBS_INFO_SIZE = 5
+OBS_HEADER_SIZE = 5 + len(ARRIVAL_POSITIONS) + OBS_INFO_SIZE
+
+OBJ_INFO_DTYPE = np.dtype([('x', np.float64), ('y', np.float64), ('width', np.float64), ('height', np.float64),
+                           ('dir', np.float64)])
+STATE_DTYPE = np.dtype([('steps', np.int64), ('level', np.int64), ('points', np.float64), ('death_idx', np.int64),
+                        ('lives', np.int64), ('arrived_frogs', np.bool_, (len(ARRIVAL_POSITIONS),)),
+                        ('frog_info', np.float64, (OBS_INFO_SIZE,)), ('num_cars', np.int64), ('num_logs', np.int64)])
+
+CARS_LANES = {pos[1]: i for i, pos in enumerate(CARS_INIT_POS)}
+LOGS_LANES = {pos[1]: i for i, pos in enumerate(LOGS_INIT_POS)}
+
+GRID_FROG_CHANNEL = 0
+GRID_CARS_CHANNEL = 1
+GRID_LOGS_CHANNEL = 2
+GRID_LILIES_CHANNEL = 3
+GRID_SHAPE = (4, NUM_ROWS, NUM_COLS)
+GRID_COLS = np.arange(NUM_COLS)
+
+DEFAULT_ACTIONS = OrderedDict([
+    ('up', ACTION_UP_KEY),
+    ('down', ACTION_DOWN_KEY),
+    ('left', ACTION_LEFT_KEY),
+    ('right', ACTION_RIGHT_KEY)])
+
+DEFAULT_REWARDS = {
+    HIT_CAR_RWD_ATTR: -20.,
+    HIT_WATER_RWD_ATTR: -20.,
+    TIME_UP_RWD_ATTR: -20.,
+    NO_LIVES_RWD_ATTR: -50,
+    NEW_LEVEL_RWD_ATTR: 100.,
+    FROG_ARRIVED_RWD_ATTR: 30.,
+    TICK_RWD_ATTR: -1.
+}
+
+
+def get_lanes_capacity(speed, level):
+    """
+    Gets upper bounds on the number of cars and logs that can simultaneously be in a lane for a game starting at the
+    given speed and level. Consecutive objects in a lane are never closer than the distance they travel between spawns.
+    :param int speed: the initial speed of the game.
+    :param int level: the initial level of the game.
+    :return tuple[int, int]: the maximum number of cars and logs per lane.
+    """
+    if speed < 1 or level < 1:
+        raise ValueError('Speed and level have to be positive to bound the number of objects in a lane')
+
+    # spawn ticks are scaled by speed / level, which converges to 1 as the level increases
+    min_ratio = min(1., speed / level)
+
+    cars_capacity = 0
+    for i in range(NUM_LANES):
+        init_x = CARS_INIT_POS[i][0]
+        distance = CARS_MAX_X - init_x if i % 2 == 0 else init_x - CARS_MIN_X
+        spacing = speed * CARS_SPEED_FACTORS[i] * (np.ceil(CARS_INIT_TICKS[i] * min_ratio) + 1)
+        cars_capacity = max(cars_capacity, int(distance // spacing) + 2)
+
+    logs_capacity = 0
+    for i in range(NUM_LANES):
+        init_x = LOGS_INIT_POS[i][0]
+        distance = LOGS_MAX_X - init_x if i % 2 == 0 else init_x - LOGS_MIN_X
+        spacing = speed * (np.ceil(LOGS_INIT_TICKS[i] * min_ratio) + 1)
+        logs_capacity = max(logs_capacity, int(distance // spacing) + 2)
+
+    return cars_capacity, logs_capacity
+
+
+def get_spawn_period(init_ticks, speed, level):
+    """
+    Gets the number of ticks between spawns of lanes. Each tick, a lane's spawn counter is decremented and, if it was
+    not positive, an object is spawned and the counter set to `init_ticks * speed / level`.
+    :param init_ticks: the lanes' initial number of ticks between spawns, a scalar or an array.
+    :param int speed: the game speed.
+    :param int level: the game level.
+    :return: the number of ticks between spawns of each lane.
+    """
+    return np.ceil(np.multiply(init_ticks, speed) / level).astype(np.int64) + 1
+
+
+def get_first_spawn_tick(ticks):
+    """
+    Gets the next tick at which lanes spawn an object, counted from the next tick, `1`.
+    :param ticks: the current value of the lanes' spawn counters, a scalar or an array.
+    :return: the first spawn tick of each lane.
+    """
+    return np.maximum(1, np.ceil(ticks).astype(np.int64) + 1)
+
+
+def get_spawn_ticks(ticks, init_ticks, speed, level, end, start=1):
+    """
+    Gets the ticks at which a lane spawns objects, in closed form.
+    :param float ticks: the current value of the lane's spawn counter.
+    :param int init_ticks: the lane's initial number of ticks between spawns.
+    :param int speed: the game speed.
+    :param int level: the game level.
+    :param int end: the last tick, counted from the next one, `1`.
+    :param int start: the first tick.
+    :return np.ndarray: the ticks in [start, end] at which objects are spawned.
+    """
+    first = int(get_first_spawn_tick(ticks))
+    period = int(get_spawn_period(init_ticks, speed, level))
+    if start > first:
+        first += -(-(start - first) // period) * period
+    return np.arange(first, end + 1, period)
+
+
+def count_spawns(ticks, init_ticks, speed, level, end):
+    """
+    Counts the objects spawned by lanes up to the given ticks, in closed form.
+    :param ticks: the current value of the lanes' spawn counters, a scalar or an array.
+    :param init_ticks: the lanes' initial number of ticks between spawns, a scalar or an array.
+    :param int speed: the game speed.
+    :param int level: the game level.
+    :param end: the last ticks, counted from the next one, `1`, broadcast with the lanes.
+    :return: the number of objects spawned by each lane in [1, end].
+    """
+    first = get_first_spawn_tick(ticks)
+    return np.maximum(0, (end - first) // get_spawn_period(init_ticks, speed, level) + 1)
+
+
+def get_fixed_obs_size(cars_capacity, logs_capacity):
+    """
+    Gets the size of the fixed observations with the given per-lane capacities.
+    :param int cars_capacity: the number of car slots per lane.
+    :param int logs_capacity: the number of log slots per lane.
+    :return int: the size of the fixed observations.
+    """
+    num_slots = NUM_LANES * (cars_capacity + logs_capacity)
+    return OBS_HEADER_SIZE + (OBS_INFO_SIZE + 1) * num_slots
+
+
+def get_fixed_obs_views(obs, cars_capacity, logs_capacity):
+    """
+    Gets views over the object sections of fixed observations, which follow the game stats, arrived frogs and frog info
+    in the order: the [x, y, width, height, dir] info of each car slot per lane, the info of each log slot per lane, the
+    validity mask of the car slots and the validity mask of the log slots. Slots in a lane are sorted by spawn time.
+    :param np.ndarray obs: the fixed observation, or an array of fixed observations along the last axis.
+    :param int cars_capacity: the number of car slots per lane.
+    :param int logs_capacity: the number of log slots per lane.
+    :return tuple: views of shape (..., lanes, capacity, 5) for the cars and logs infos and of shape (..., lanes,
+    capacity) for the cars and logs masks.
+    """
+    shape = obs.shape[:-1]
+    cars_end = OBS_HEADER_SIZE + OBS_INFO_SIZE * NUM_LANES * cars_capacity
+    logs_end = cars_end + OBS_INFO_SIZE * NUM_LANES * logs_capacity
+    cars_mask_end = logs_end + NUM_LANES * cars_capacity
+    return (obs[..., OBS_HEADER_SIZE:cars_end].reshape(shape + (NUM_LANES, cars_capacity, OBS_INFO_SIZE)),
+            obs[..., cars_end:logs_end].reshape(shape + (NUM_LANES, logs_capacity, OBS_INFO_SIZE)),
+            obs[..., logs_end:cars_mask_end].reshape(shape + (NUM_LANES, cars_capacity)),
+            obs[..., cars_mask_end:].reshape(shape + (NUM_LANES, logs_capacity)))
+
+
+def get_grid_row(y, height):
+    """
+    Gets the row of the grid observation containing the vertical center of an object.
+    :param float y: the vertical position of the object.
+    :param int height: the height of the object.
+    :return int: the grid row, clipped to the grid.
+    """
+    return min(NUM_ROWS - 1, max(0, int((y + height / 2 - MIN_Y_POS) // CELL_HEIGHT)))
+
+
+def get_grid_col(x, width):
+    """
+    Gets the column of the grid observation containing the horizontal center of an object.
+    :param float x: the horizontal position of the object.
+    :param int width: the width of the object.
+    :return int: the grid column, clipped to the grid.
+    """
+    return min(NUM_COLS - 1, max(0, int((x + width / 2) // CELL_WIDTH)))
+
+
+def get_grid_cols(x, width):
+    """
+    Gets the columns of the grid observation overlapped by an object, which may lie outside the grid.
+    :param float x: the horizontal position of the object, truncated as in `pygame.Rect`.
+    :param int width: the width of the object.
+    :return tuple[int, int]: the first and last overlapped columns.
+    """
+    x = int(x)
+    return x // CELL_WIDTH, (x + int(width) - 1) // CELL_WIDTH
+
+
+def fill_grid_row(row, x, width):
+    """
+    Marks the cells of a grid row overlapped by an object.
+    :param np.ndarray row: the grid row.
+    :param float x: the horizontal position of the object.
+    :param int width: the width of the object.
+    """
+    first, last = get_grid_cols(x, width)
+    row[max(0, first):max(0, last + 1)] = 1
 
 
 class FroggerState(object):
@@ -111,30 +314,86 @@ class FroggerState(object):
         :param lst obs: the array with the game observation we want to convert.
         :return FroggerState: the state corresponding to the given observation.
         """
-        game_state = FroggerState()
-        game_state.steps = int(obs[0])
-        game_state.level = int(obs[1])
-        game_state.points = obs[2].item()
-        game_state.death_idx = int(obs[3])
-        game_state.lives = max(0, int(obs[4]))
-        game_state.arrived_frogs = obs[5:10].astype(bool).tolist()
-        game_state.frog_info = obs[10:15].tolist()
-
-        # reads cars until reaching separator
-        idx = 15
-        info_size = 5
-        while True:
-            if obs[idx] == OBS_SEPARATOR:
-                break
-            game_state.car_infos.append(obs[idx:idx + info_size].tolist())
-            idx += info_size
-
-        # reads logs
-        for idx in range(idx + 1, len(obs), info_size):
-            game_state.log_infos.append(obs[idx:idx + info_size].tolist())
+        obs = np.asarray(obs)
+        stats, arrived_frogs, frog_info, car_infos, log_infos = FroggerState.decode_observation(obs)
 
+        game_state = FroggerState()
+        game_state.steps = int(stats[0])
+        game_state.level = int(stats[1])
+        game_state.points = stats[2].item()
+        game_state.death_idx = int(stats[3])
+        game_state.lives = max(0, int(stats[4]))
+        game_state.arrived_frogs = arrived_frogs.astype(bool).tolist()
+        game_state.frog_info = frog_info.tolist()
+        game_state.car_infos = car_infos.tolist()
+        game_state.log_infos = log_infos.tolist()
         return game_state
 
+    @staticmethod
+    def decode_observation(obs):
+        """
+        Decodes the given observation into views over its sections, without copying.
+        :param np.ndarray obs: the array with the game observation, as given by `to_observation`.
+        :return tuple: views over the game stats [steps, level, points, death_idx, lives], the arrived frogs flags, the
+        frog info, the cars infos, of shape (num_cars, 5), and the logs infos, of shape (num_logs, 5).
+        """
+        # separator is the first info-aligned element marked as such
+        sep_idx = OBS_HEADER_SIZE + OBS_INFO_SIZE * int(np.argmax(obs[OBS_HEADER_SIZE::OBS_INFO_SIZE] == OBS_SEPARATOR))
+        return (obs[:5],
+                obs[5:10],
+                obs[10:OBS_HEADER_SIZE],
+                obs[OBS_HEADER_SIZE:sep_idx].reshape(-1, OBS_INFO_SIZE),
+                obs[sep_idx + 1:].reshape(-1, OBS_INFO_SIZE))
+
+    @staticmethod
+    def decode_observations(obs, lengths=None):
+        """
+        Decodes a batch of observations into structured arrays.
+        :param np.ndarray obs: the 2D array with one observation per row, as given by `to_observation`. Rows of
+        observations shorter than the array are padded at the end, either with `NaN` or with any values if `lengths`
+        is given.
+        :param np.ndarray lengths: the length of each observation, `None` if padding is done with `NaN`.
+        :return tuple: a structured array of shape (batch,) with `STATE_DTYPE`, containing the game stats, frog info
+        and number of cars and logs of each observation, and structured arrays of shape (batch, max_num_cars) and
+        (batch, max_num_logs) with `OBJ_INFO_DTYPE`, containing each observation's cars and logs infos, zero-padded.
+        """
+        obs = np.asarray(obs, dtype=np.float64)
+        if len(obs) == 0:
+            obs = np.empty((0, OBS_HEADER_SIZE + 1))  # empty batches, whatever their observations' length
+        batch, obs_len = obs.shape
+        if lengths is None:
+            lengths = obs_len - np.count_nonzero(np.isnan(obs), axis=1)
+
+        # separator is the first info-aligned element marked as such
+        sep_idxs = OBS_HEADER_SIZE + \
+                   OBS_INFO_SIZE * np.argmax(obs[:, OBS_HEADER_SIZE::OBS_INFO_SIZE] == OBS_SEPARATOR, axis=1)
+
+        states = np.empty(batch, dtype=STATE_DTYPE)
+        states['steps'] = obs[:, 0]
+        states['level'] = obs[:, 1]
+        states['points'] = obs[:, 2]
+        states['death_idx'] = obs[:, 3]
+        states['lives'] = np.maximum(0, obs[:, 4])
+        states['arrived_frogs'] = obs[:, 5:10]
+        states['frog_info'] = obs[:, 10:OBS_HEADER_SIZE]
+        states['num_cars'] = (sep_idxs - OBS_HEADER_SIZE) // OBS_INFO_SIZE
+        states['num_logs'] = (np.asarray(lengths) - sep_idxs - 1) // OBS_INFO_SIZE
+
+        cars = FroggerState._gather_infos(obs, np.full(batch, OBS_HEADER_SIZE), states['num_cars'])
+        logs = FroggerState._gather_infos(obs, sep_idxs + 1, states['num_logs'])
+        return states, cars, logs
+
+    @staticmethod
+    def _gather_infos(obs, start_idxs, counts):
+        # gathers the infos of each row into a zero-padded (batch, max_count, 5) array
+        max_count = int(counts.max()) if len(counts) > 0 else 0
+        slots = np.arange(max_count)
+        idxs = start_idxs[:, None, None] + OBS_INFO_SIZE * slots[None, :, None] + np.arange(OBS_INFO_SIZE)
+        idxs = np.minimum(idxs, obs.shape[1] - 1).reshape(len(obs), max_count * OBS_INFO_SIZE)
+        infos = np.take_along_axis(obs, idxs, axis=1).reshape(len(obs), max_count, OBS_INFO_SIZE)
+        infos[slots[None, :] >= counts[:, None]] = 0
+        return infos.view(OBJ_INFO_DTYPE)[..., 0]
+
     def to_observation(self):
         """
         Converts the frogger state into a numeric array suitable to represent observation features.
@@ -162,6 +421,73 @@ class FroggerState(object):
 
         return np.array(obs_list)
 
+    def to_fixed_observation(self, cars_capacity, logs_capacity, out=None):
+        """
+        Converts the frogger state into a fixed-size numeric array, where cars and logs are placed in per-lane slots
+        followed by the slots' validity masks (see `get_fixed_obs_views`). Objects exceeding a lane's capacity are
+        discarded.
+        :param int cars_capacity: the number of car slots per lane.
+        :param int logs_capacity: the number of log slots per lane.
+        :param np.ndarray out: the array in which to write the observation, a new one is created if `None`.
+        :return np.ndarray: an array containing all this states' features.
+        """
+        if out is None:
+            out = np.empty(get_fixed_obs_size(cars_capacity, logs_capacity))
+
+        # add game stats and frog info
+        out[0] = self.steps
+        out[1] = self.level
+        out[2] = self.points
+        out[3] = self.death_idx
+        out[4] = self.lives
+        out[5:10] = self.arrived_frogs
+        out[10:OBS_HEADER_SIZE] = self.frog_info
+
+        # adds car and log rectangles to their lanes' slots
+        cars, logs, cars_mask, logs_mask = get_fixed_obs_views(out, cars_capacity, logs_capacity)
+        out[OBS_HEADER_SIZE:] = 0
+        self._fill_lanes(self.car_infos, CARS_LANES, cars, cars_mask)
+        self._fill_lanes(self.log_infos, LOGS_LANES, logs, logs_mask)
+
+        return out
+
+    def to_grid_observation(self, out=None):
+        """
+        Converts the frogger state into a cell-quantized occupancy grid of shape `GRID_SHAPE`, with channels for the frog,
+        cars, logs and occupied lilies. Objects occupy every cell they overlap except for the frog, which occupies the cell
+        of its center. Lilies lie above the grid, so they are marked on the columns of its first row.
+        :param np.ndarray out: the uint8 array in which to write the observation, a new one is created if `None`.
+        :return np.ndarray: an array containing the occupancy grid of this state.
+        """
+        if out is None:
+            out = np.zeros(GRID_SHAPE, dtype=np.uint8)
+        else:
+            out.fill(0)
+
+        for info in self.car_infos:
+            fill_grid_row(out[GRID_CARS_CHANNEL, get_grid_row(info[1], info[3])], info[0], info[2])
+        for info in self.log_infos:
+            fill_grid_row(out[GRID_LOGS_CHANNEL, get_grid_row(info[1], info[3])], info[0], info[2])
+        for i, arrived in enumerate(self.arrived_frogs):
+            if arrived:
+                out[GRID_LILIES_CHANNEL, 0, get_grid_col(ARRIVAL_POSITIONS[i], FROG_SIZE)] = 1
+
+        x, y, width, height = self.frog_info[:4]
+        out[GRID_FROG_CHANNEL, get_grid_row(y, height), get_grid_col(x, width)] = 1
+
+        return out
+
+    @staticmethod
+    def _fill_lanes(infos, lanes, slots, mask):
+        counts = [0] * NUM_LANES
+        capacity = mask.shape[-1]
+        for info in infos:
+            lane = lanes[info[1]]
+            if counts[lane] < capacity:
+                slots[lane, counts[lane]] = info
+                mask[lane, counts[lane]] = 1
+                counts[lane] += 1
+
     @staticmethod
     def _get_obj_info(obj):
         """
@@ -169,4 +495,4 @@ class FroggerState(object):
         :param Object obj: the object from which to retrieve the coordinates.
         :return list: a list with the object information, namely [x, y, width, height, dir].
         """
-        return [obj.position[0], obj.position[1], obj.sprite.get_width(), obj.sprite.get_height(), obj.way]
+        return [obj.x, obj.y, obj.sprite.get_width(), obj.sprite.get_height(), obj.way]
@@ -0,0 +1,207 @@
+__author__ = 'Pedro Sequeira'
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from frogger import *
+
+# steps after which games are measured, such that lanes have the objects' density of running games
+WARMUP_STEPS = 200
+DEFAULT_REPEATS = 5
+DEFAULT_THRESHOLD = 0.1
+DEFAULT_SPEEDS = [1, 3, 5]
+DEFAULT_LEVELS = [1, 3]
+
+
+def _create_env(speed, level, **kwargs):
+    # environments are created lazily as they require PLE
+    from frogger.gym import FroggerEnv
+    env = FroggerEnv(display_screen=False, sound=False, add_noop_action=True, speed=speed, level=level, **kwargs)
+    env.seed(0)
+    env.reset()
+    rng = np.random.RandomState(0)
+    for _ in range(WARMUP_STEPS):
+        if env.step(rng.randint(env.action_space.n))[2]:
+            env.reset()
+    return env
+
+
+def _time_ops(op, num_ops, repeats):
+    # best time per operation across repeats, the least affected by other processes
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for i in range(num_ops):
+            op(i)
+        best = min(best, (time.perf_counter() - start) / num_ops)
+    return best
+
+
+def _env_step(num_ops, repeats, speed, level, **kwargs):
+    env = _create_env(speed, level, **kwargs)
+    actions = np.random.RandomState(1).randint(env.action_space.n, size=num_ops)
+    snap = env.snapshot()
+
+    # games that are over go back to the state after warming up
+    def step(i):
+        if env.step(actions[i])[2]:
+            env.restore(snap)
+
+    return _time_ops(step, num_ops, repeats)
+
+
+def bench_game_step(num_ops, repeats, speed, level):
+    game = _create_env(speed, level, headless=True).game_state.game
+    return _time_ops(lambda i: game.step(0), num_ops * ANIMATIONS_PER_MOVE, repeats)
+
+
+def bench_env_step_logic(num_ops, repeats, speed, level):
+    return _env_step(num_ops, repeats, speed, level, load_assets=False)
+
+
+def bench_env_step_headless(num_ops, repeats, speed, level):
+    return _env_step(num_ops, repeats, speed, level, headless=True)
+
+
+def bench_env_step_rendered(num_ops, repeats, speed, level):
+    return _env_step(num_ops // 10, repeats, speed, level, headless=False)
+
+
+def bench_reset(num_ops, repeats, speed, level):
+    env = _create_env(speed, level, headless=True)
+    return _time_ops(lambda i: env.reset(), num_ops // 10, repeats)
+
+
+def bench_get_game_state(num_ops, repeats, speed, level):
+    game = _create_env(speed, level, headless=True).game_state.game
+    return _time_ops(lambda i: game.getGameState(), num_ops, repeats)
+
+
+def bench_from_observation(num_ops, repeats, speed, level):
+    obs = _create_env(speed, level, headless=True).game_state.game.getGameState()
+    return _time_ops(lambda i: FroggerState.from_observation(obs), num_ops, repeats)
+
+
+def bench_init_resources(num_ops, repeats, speed, level):
+    game = _create_env(speed, level, headless=True).game_state.game
+
+    def init_resources(i):
+        game.game_init = False
+        game._init_resources()
+
+    return _time_ops(init_resources, max(1, num_ops // 100), repeats)
+
+
+# benchmarks by name, each returning the seconds per operation (step, reset, etc.)
+BENCHMARKS = {
+    'game_step': bench_game_step,
+    'env_step_logic': bench_env_step_logic,
+    'env_step_headless': bench_env_step_headless,
+    'env_step_rendered': bench_env_step_rendered,
+    'reset': bench_reset,
+    'get_game_state': bench_get_game_state,
+    'from_observation': bench_from_observation,
+    'init_resources': bench_init_resources,
+}
+
+# benchmarks not depending on the game speed and level, only measured once
+CONFIG_FREE_BENCHMARKS = {'from_observation', 'init_resources'}
+
+
+def get_result_key(name, speed, level):
+    if name in CONFIG_FREE_BENCHMARKS:
+        return name
+    return '{}[speed={},level={}]'.format(name, speed, level)
+
+
+def run_benchmarks(names=None, speeds=None, levels=None, num_ops=1000, repeats=DEFAULT_REPEATS, verbose=True):
+    """
+    Runs the given benchmarks for all combinations of game speeds and levels.
+    :param list names: the names of the benchmarks to run, as in `BENCHMARKS`, `None` running all of them.
+    :param list speeds: the game speeds at which to run the benchmarks.
+    :param list levels: the game levels at which to run the benchmarks.
+    :param int num_ops: the number of operations timed by each repeat, scaled down for the slowest benchmarks.
+    :param int repeats: the number of times each benchmark is timed, the best time being kept.
+    :param bool verbose: whether to print each result as it is measured.
+    :return dict: the seconds per operation of each benchmark, speed and level, keyed by `get_result_key`.
+    """
+    names = list(BENCHMARKS.keys()) if names is None else names
+    speeds = DEFAULT_SPEEDS if speeds is None else speeds
+    levels = DEFAULT_LEVELS if levels is None else levels
+    if not os.environ.get('SDL_VIDEODRIVER'):
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    if not os.environ.get('SDL_AUDIODRIVER'):
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+    results = {}
+    for name in names:
+        if name not in BENCHMARKS:
+            raise ValueError('Unknown benchmark: {}'.format(name))
+        for speed in speeds:
+            for level in levels:
+                key = get_result_key(name, speed, level)
+                if key in results:
+                    continue
+                results[key] = BENCHMARKS[name](num_ops, repeats, speed, level)
+                if verbose:
+                    print('{:<45} {:>12.1f} ops/s {:>12.2f} us/op'.format(key, 1 / results[key], results[key] * 1e6))
+    return results
+
+
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD, verbose=True):
+    """
+    Compares benchmark results against a baseline.
+    :param dict results: the seconds per operation of each benchmark, as given by `run_benchmarks`.
+    :param dict baseline: the baseline seconds per operation of each benchmark.
+    :param float threshold: the relative slowdown above which a benchmark is considered to have regressed.
+    :param bool verbose: whether to print the comparison of each benchmark.
+    :return list: the keys of the benchmarks that regressed.
+    """
+    regressions = []
+    for key, secs in results.items():
+        if key not in baseline:
+            continue
+        change = secs / baseline[key] - 1
+        regressed = change > threshold
+        if regressed:
+            regressions.append(key)
+        if verbose:
+            print('{:<45} {:>+8.1%} time/op{}'.format(key, change, '  REGRESSION' if regressed else ''))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Measures the throughput of the Frogger game and environment.')
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS.keys()), help='the benchmarks to run')
+    parser.add_argument('--speeds', nargs='+', type=int, default=DEFAULT_SPEEDS, help='the game speeds')
+    parser.add_argument('--levels', nargs='+', type=int, default=DEFAULT_LEVELS, help='the game levels')
+    parser.add_argument('--ops', type=int, default=1000, help='the number of operations timed by each repeat')
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS, help='the number of repeats per benchmark')
+    parser.add_argument('--save', help='the path to a json file in which to save the results as a baseline')
+    parser.add_argument('--baseline', help='the path to a json file with the baseline results to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='the relative slowdown above which a benchmark regressed')
+    args = parser.parse_args(args)
+
+    results = run_benchmarks(args.benchmarks, args.speeds, args.levels, args.ops, args.repeats)
+    if args.save is not None:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    if args.baseline is None:
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    print()
+    regressions = compare_results(results, baseline, args.threshold)
+    if len(regressions) > 0:
+        print('{} benchmark(s) regressed more than {:.0%}'.format(len(regressions), args.threshold))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,7 +5,8 @@ import numpy as np
 from gym import Env, spaces
 from gym.envs import register
 from ple import PLE
-from frogger.ple import Frogger, HEIGHT, WIDTH, ANIMATIONS_PER_MOVE
+from frogger.ple import Frogger, HEIGHT, WIDTH, ANIMATIONS_PER_MOVE, GRID_SHAPE
+from frogger.profiling import PhaseProfiler
 
 FROGGER_ENTRY_POINT_STR = 'frogger.gym:FroggerEnv'
 MAX_EPISODE_STEPS_ATTR = 'wrapper_config.TimeLimit.max_episode_steps'
@@ -23,16 +24,41 @@ MAX_STEPS_ATTR = 'max_steps'
 FORCE_FPS_ATTR = 'force_fps'
 SHOW_STATS_ATTR = 'show_stats'
 SOUND_ATTR = 'sound'
+HEADLESS_ATTR = 'headless'
+OBS_TYPE_ATTR = 'obs_type'
+LOAD_ASSETS_ATTR = 'load_assets'
+DIRTY_RENDERING_ATTR = 'dirty_rendering'
+RENDER_INTERVAL_ATTR = 'render_interval'
+FRAME_SIZE_ATTR = 'frame_size'
+GRAYSCALE_ATTR = 'grayscale'
+FRAME_STACK_ATTR = 'frame_stack'
+RECORDER_ATTR = 'recorder'
+PROFILE_ATTR = 'profile'
+KEYBOARD_INPUT_ATTR = 'keyboard_input'
+COPY_OBS_ATTR = 'copy_obs'
+
+RECTS_OBS_TYPE = 'rects'
+FIXED_OBS_TYPE = 'fixed'
+GRID_OBS_TYPE = 'grid'
+PIXELS_OBS_TYPE = 'pixels'
 
 DEFAULT_MAX_STEPS = 300
 DEFAULT_LIVES = 3
+DEFAULT_RENDER_INTERVAL = 1
+DEFAULT_FRAME_STACK = 1
 DEFAULT_GYM_ENV_ID = 'Frogger-v0'
 
+PHASE_TIMES_INFO = 'phase_times'
+
+# integer luma weights (ITU-R BT.601) summing to 256
+GRAYSCALE_WEIGHTS = np.array([77, 150, 29], dtype=np.uint16)
+
 # default profile
 register(
     id=DEFAULT_GYM_ENV_ID,
     kwargs={MAX_STEPS_ATTR: DEFAULT_MAX_STEPS,
             LIVES_ATTR: DEFAULT_LIVES,
+            RENDER_INTERVAL_ATTR: DEFAULT_RENDER_INTERVAL,
             MAX_EPISODE_STEPS_ATTR: DEFAULT_MAX_STEPS * DEFAULT_LIVES},
     entry_point=FROGGER_ENTRY_POINT_STR,
     nondeterministic=False,
@@ -44,31 +70,78 @@ class FroggerEnv(Env):
 
     def __init__(self, fps=30, display_screen=True, add_noop_action=False, actions=None, rewards=None,
                  lives=3, speed=3, level=1, num_arrived_frogs=5, max_steps=1000, force_fps=False,
-                 show_stats=True, sound=True):
+                 show_stats=True, sound=True, headless=False, obs_type=FIXED_OBS_TYPE, load_assets=True,
+                 dirty_rendering=False, render_interval=DEFAULT_RENDER_INTERVAL, frame_size=None, grayscale=False,
+                 frame_stack=DEFAULT_FRAME_STACK, recorder=None, profile=False, keyboard_input=False,
+                 copy_obs=True):
         self.metadata['video.frames_per_second'] = fps
 
+        # game ticks within an action are only drawn every render interval, the last one always being drawn
+        if render_interval < 1:
+            raise ValueError('Render interval has to be positive: {}'.format(render_interval))
+        self.render_interval = render_interval
+
         # set headless mode if not displaying to screen
-        if not display_screen:
+        if not display_screen and load_assets:
             os.environ['SDL_VIDEODRIVER'] = 'dummy'
 
         # open up a game state to communicate with emulator
         game = Frogger(actions=actions, rewards=rewards, lives=lives, speed=speed, level=level,
                        num_arrived_frogs=num_arrived_frogs, max_steps=max_steps,
-                       show_stats=show_stats, sound=sound)
+                       show_stats=show_stats, sound=sound, headless=headless, load_assets=load_assets,
+                       dirty_rendering=dirty_rendering, keyboard_input=keyboard_input)
+        self.headless = game.headless
 
-        self.game_state = PLE(game, fps=fps, display_screen=display_screen, force_fps=not force_fps,
-                              add_noop_action=add_noop_action)
+        # games without assets do not use PLE, which opens a display
+        if load_assets:
+            self.game_state = PLE(game, fps=fps, display_screen=display_screen, force_fps=not force_fps,
+                                  add_noop_action=add_noop_action)
+        else:
+            self.game_state = LogicGameState(game, fps=fps, force_fps=not force_fps, add_noop_action=add_noop_action)
         self.game_state.init()
 
         self._action_set = self.game_state.getActionSet()
         self.action_space = spaces.Discrete(len(self._action_set))
-        self.observation_space = \
-            spaces.Box(low=0, high=255, shape=self.game_state.game.getGameState().shape, dtype=np.uint8)
+
+        # fixed, grid and pixels observations are written to buffers reused across steps, copied unless requested
+        # otherwise, rects ones vary in size with the objects
+        self.copy_obs = copy_obs and obs_type != RECTS_OBS_TYPE
+        self.frame_stack = None
+        if obs_type == FIXED_OBS_TYPE:
+            self._get_obs = game.getFixedGameState
+        elif obs_type == RECTS_OBS_TYPE:
+            self._get_obs = game.getGameState
+        elif obs_type == GRID_OBS_TYPE:
+            self._get_obs = game.getGridGameState
+        elif obs_type == PIXELS_OBS_TYPE:
+            if not load_assets:
+                raise ValueError('Pixels observations require loading assets')
+            self.frame_stack = FrameStack(frame_size, grayscale, frame_stack)
+            self._get_obs = self._get_pixels_obs
+        else:
+            raise ValueError('Unknown observation type: {}'.format(obs_type))
+        self.obs_type = obs_type
+        if obs_type == GRID_OBS_TYPE:
+            self.observation_space = spaces.Box(low=0, high=1, shape=GRID_SHAPE, dtype=np.uint8)
+        elif obs_type == PIXELS_OBS_TYPE:
+            self.observation_space = spaces.Box(low=0, high=255, shape=self.frame_stack.shape, dtype=np.uint8)
+        else:
+            # the shape of rects observations is only that of the initial one, as it varies with the objects
+            self.observation_space = spaces.Box(
+                low=-np.inf, high=np.inf, shape=self._get_obs().shape, dtype=np.float64)
 
         self.previous_score = 0.
         self.last_action = None
         self.monitor = None
 
+        # frames of all game ticks are copied to the recorder, written from its own thread
+        if recorder is not None and not load_assets:
+            raise ValueError('Recording requires loading assets')
+        self.recorder = recorder
+
+        # times the phases of steps, reporting them in the steps' info
+        self.profiler = PhaseProfiler().attach(self) if profile else None
+
     def step(self, a):
 
         action = None if a is None else self._action_set[a]
@@ -80,33 +153,75 @@ class FroggerEnv(Env):
             # sets action, activating necessary keys for PyGame
             self._set_action(action)
 
-            # performs several updates to the game per action (move)
+            # performs several updates to the game per action (move), drawing all of them when recording
             for i in range(ANIMATIONS_PER_MOVE):
                 if not self.game_state.force_fps:
                     self.game_state.game.tick(self.game_state.fps)
-                self.game_state.game.step(0)
-                self.game_state._draw_frame()
-
-                # trick to update external Gym Monitor (frames within action) if one was provided
-                if self.monitor is not None and i < ANIMATIONS_PER_MOVE - 1:
-                    self.monitor.video_recorder.capture_frame()
+                draw = self.monitor is not None or self.recorder is not None or \
+                       (i + 1) % self.render_interval == 0 or i == ANIMATIONS_PER_MOVE - 1
+                self.game_state.game.step(0, draw)
+                if draw and not self.headless:
+                    self.game_state._draw_frame()
+                if self.monitor is not None or self.recorder is not None:
+                    self._capture_frame(i)
 
             # gets total reward collected by this action
             reward = self._get_reward()
 
-        state = self.game_state.game.getGameState()
+        state = self._get_obs()
+        if self.copy_obs:
+            state = state.copy()
         terminal = self.game_state.game_over()
 
-        return state, reward, terminal, {}
+        info = {}
+        if self.profiler is not None:
+            info[PHASE_TIMES_INFO] = self.profiler.pop_step_times()
+        return state, reward, terminal, info
 
     def reset(self):
         self.previous_score = 0.
         self.last_action = None
         self.game_state.reset_game()
-        return self.game_state.game.getGameState()
+        if self.frame_stack is not None:
+            self.frame_stack.reset()
+        if self.recorder is not None:
+            self.recorder.new_episode()
+            self.recorder.record_surface(self.game_state.game.get_screen())
+        obs = self._get_obs()
+        if self.copy_obs:
+            obs = obs.copy()
+        if self.profiler is not None:
+            self.profiler.pop_step_times()  # steps only report their own phases
+        return obs
+
+    def close(self):
+        if self.recorder is not None:
+            self.recorder.close()
 
     def render(self, mode='human', close=False):
-        return self._get_image()
+        image = self._get_image()
+
+        # headless games only update the display when explicitly rendered
+        if self.headless and mode == 'human':
+            self.game_state._draw_frame()
+        return image
+
+    def snapshot(self):
+        """
+        Captures the complete state of the environment, as given by `Frogger.snapshot`.
+        :return tuple: the snapshot of the environment, to be passed to `restore`.
+        """
+        return self.game_state.game.snapshot(), self.previous_score, self.last_action
+
+    def restore(self, snap):
+        """
+        Restores the environment to the state captured by `snapshot`.
+        :param tuple snap: the snapshot of the environment.
+        """
+        game_snap, self.previous_score, self.last_action = snap
+        self.game_state.game.restore(game_snap)
+        if self.frame_stack is not None:
+            self.frame_stack.reset()
 
     def seed(self, seed=None):
         rng = self.game_state.rng = self.game_state.game.rng = np.random.RandomState(0 if seed is None else seed)
@@ -124,6 +239,18 @@ class FroggerEnv(Env):
         self.game_state.game._setAction(action, self.last_action)
         self.last_action = action
 
+    def _capture_frame(self, i):
+        if self.recorder is not None:
+            self.recorder.record_surface(self.game_state.game.get_screen())
+
+        # trick to update external Gym Monitor (frames within action) if one was provided
+        if self.monitor is not None and i < ANIMATIONS_PER_MOVE - 1:
+            self.monitor.video_recorder.capture_frame()
+
+    def _get_pixels_obs(self):
+        # the screen view is released on return, before the game is drawn again
+        return self.frame_stack.push(self.game_state.game.get_screen_view())
+
     def _get_image(self):
         image_rotated = np.fliplr(
             np.rot90(self.game_state.getScreenRGB(), 3))  # Hack to fix the rotated image returned by ple
@@ -132,3 +259,131 @@ class FroggerEnv(Env):
     @property
     def _n_actions(self):
         return len(self._action_set)
+
+
+class FrameStack(object):
+    """
+    Preprocesses screen frames into `uint8` frames, optionally downsampled and converted to grayscale, and keeps the
+    most recent ones in a ring buffer. Each frame is stored twice such that the stack is always a contiguous view of the
+    buffer, ordered from the oldest to the most recent frame, without copying it.
+    """
+
+    def __init__(self, size=None, grayscale=False, depth=DEFAULT_FRAME_STACK):
+        """
+        Creates a new frame stack.
+        :param tuple size: the (height, width) of the frames, the screen being downsampled by taking its nearest pixels.
+        `None` keeps the screen's resolution.
+        :param bool grayscale: whether to convert the frames to grayscale.
+        :param int depth: the number of frames in the stack.
+        """
+        height, width = (HEIGHT, WIDTH) if size is None else size
+        if not (0 < height <= HEIGHT and 0 < width <= WIDTH):
+            raise ValueError('Invalid frame size: {}'.format(size))
+        if depth < 1:
+            raise ValueError('Frame stack depth has to be positive: {}'.format(depth))
+
+        # the screen rows and columns sampled for each frame pixel
+        self.rows = ((np.arange(height) + 0.5) * HEIGHT / height).astype(np.intp)
+        self.cols = ((np.arange(width) + 0.5) * WIDTH / width).astype(np.intp)
+        self.downsample = (height, width) != (HEIGHT, WIDTH)
+        self.grayscale = grayscale
+        self.depth = depth
+        self.shape = (depth, height, width) if grayscale else (depth, height, width, 3)
+        self.buffer = np.zeros((2 * depth,) + self.shape[1:], dtype=np.uint8)
+        self.idx = 0
+        self.empty = True
+
+        # intermediate frames, preallocated such that pushing frames does not allocate memory
+        self._rows_frame = np.empty((height, WIDTH, 3), dtype=np.uint8)
+        self._frame = np.empty((height, width, 3), dtype=np.uint8)
+        self._frame16 = np.empty((height, width, 3), dtype=np.uint16)
+        self._gray16 = np.empty((height, width), dtype=np.uint16)
+        self._row_idxs = self.rows.tolist()
+
+    def reset(self):
+        """
+        Empties the stack, such that the next pushed frame fills all of it.
+        """
+        self.idx = 0
+        self.empty = True
+
+    def push(self, screen):
+        """
+        Preprocesses and adds a screen frame to the stack, replacing the oldest one.
+        :param np.ndarray screen: the screen's pixels of shape (HEIGHT, WIDTH, 3).
+        :return np.ndarray: the stack of frames, a view of a buffer reused across pushes.
+        """
+        slot = self.buffer[self.idx]
+
+        # samples the screen straight into the stack, or into the frame converted to grayscale
+        if self.downsample:
+            frame = self._frame if self.grayscale else slot
+            # the screen is not contiguous, so rows are copied one by one as taking them would copy the whole screen
+            for i, row in enumerate(self._row_idxs):
+                np.copyto(self._rows_frame[i], screen[row])
+            np.take(self._rows_frame, self.cols, axis=1, out=frame, mode='clip')
+        else:
+            frame = screen
+            if not self.grayscale:
+                np.copyto(slot, screen)
+        if self.grayscale:
+            np.copyto(self._frame16, frame)
+            np.dot(self._frame16, GRAYSCALE_WEIGHTS, out=self._gray16)
+            np.right_shift(self._gray16, 8, out=self._gray16)
+            np.copyto(slot, self._gray16, casting='unsafe')
+
+        if self.empty:
+            self.buffer[1:] = slot
+            self.empty = False
+        else:
+            self.buffer[self.idx + self.depth] = slot
+            self.idx = (self.idx + 1) % self.depth
+        return self.buffer[self.idx:self.idx + self.depth]
+
+
+class LogicGameState(object):
+    """
+    Drives a Frogger game created without assets in place of PLE, providing the interface used by `FroggerEnv` without
+    initializing pygame's display.
+    """
+
+    def __init__(self, game, fps=30, force_fps=True, add_noop_action=True, rng=24):
+        """
+        Creates a new game driver.
+        :param Frogger game: the game, created with `load_assets=False`.
+        :param int fps: the frames per second at which the game runs when not forcing fps.
+        :param bool force_fps: whether to run the game as fast as possible.
+        :param bool add_noop_action: whether to add a no-move action to the action set.
+        :param int rng: the seed of the random number generator, as in PLE.
+        """
+        self.game = game
+        self.fps = fps
+        self.force_fps = force_fps
+        self.add_noop_action = add_noop_action
+        self.rng = np.random.RandomState(rng)
+        self.game.setRNG(self.rng)
+
+    def init(self):
+        self.game._setup()
+        self.game.init()
+
+    def getActionSet(self):
+        actions = list(self.game.actions.values())
+        if self.add_noop_action:
+            actions.append(None)
+        return actions
+
+    def reset_game(self):
+        self.game.reset()
+
+    def game_over(self):
+        return self.game.game_over()
+
+    def score(self):
+        return self.game.getScore()
+
+    def getScreenRGB(self):
+        return self.game.getScreenRGB()
+
+    def _draw_frame(self):
+        pass
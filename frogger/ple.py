@@ -1,8 +1,9 @@
 __author__ = 'Pedro Sequeira'
 
 import pygame
-from collections import OrderedDict
+import numpy as np
 from sys import exit
+from collections import namedtuple
 from os.path import dirname, abspath, join
 from pygame.constants import QUIT, KEYDOWN
 from ple.games.base import PyGameWrapper
@@ -10,40 +11,54 @@ from pygame.rect import Rect
 from frogger import *
 
 
-# functions
-def draw_list(lst, screen):
-    for sprite in lst:
-        sprite.draw(screen)
+# complete simulation state of a Frogger game, see `Frogger.snapshot`
+FroggerSnapshot = namedtuple('FroggerSnapshot', [
+    'game', 'frog', 'frog_log', 'key_pressed', 'process_events', 'dead', 'arrived_x',
+    'ticks_cars', 'ticks_logs', 'num_spawned', 'car_lanes', 'log_lanes', 'rng_state'])
+
+
+GRID_COL_BITS = 1 << GRID_COLS
 
+# maximal number of regions pending update in the display or pixels with dirty rendering
+MAX_DIRTY_RECTS = 512
 
-def move_list(lst, speed):
-    for sprite in lst:
-        sprite.move(speed)
+# alpha copies of the death images by path, shared by all games in the process
+ALPHA_IMAGES = {}
+
+
+# functions
+def get_blit_rect(blit):
+    # the screen region covered by a (sprite, position, area) blit
+    sprite, position, area = blit
+    if area is None:
+        return Rect(position, sprite.get_size())
+    return Rect(position, Rect(area).clip(sprite.get_rect()).size)
+
+
+def merge_rects(rects):
+    # replaces colliding rects by their union, such that each region is only updated once
+    merged = []
+    for rect in sorted(rects, key=lambda r: (r.top, r.left)):
+        i = rect.collidelist(merged)
+        while i != -1:
+            rect = rect.union(merged.pop(i))
+            i = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
 
 
 class Frogger(PyGameWrapper):
     def __init__(self, actions=None, rewards=None, lives=3, speed=3, level=1,
-                 num_arrived_frogs=5, max_steps=60, show_stats=True, sound=True):
+                 num_arrived_frogs=5, max_steps=60, show_stats=True, sound=True, headless=False, load_assets=True,
+                 dirty_rendering=False, keyboard_input=False):
 
         if actions is None:
-            actions = OrderedDict([
-                ('up', ACTION_UP_KEY),
-                ('down', ACTION_DOWN_KEY),
-                ('left', ACTION_LEFT_KEY),
-                ('right', ACTION_RIGHT_KEY)])
+            actions = DEFAULT_ACTIONS.copy()
 
         super().__init__(WIDTH, HEIGHT, actions=actions)
 
         if rewards is None:
-            rewards = {
-                HIT_CAR_RWD_ATTR: -20.,
-                HIT_WATER_RWD_ATTR: -20.,
-                TIME_UP_RWD_ATTR: -20.,
-                NO_LIVES_RWD_ATTR: -50,
-                NEW_LEVEL_RWD_ATTR: 100.,
-                FROG_ARRIVED_RWD_ATTR: 30.,
-                TICK_RWD_ATTR: -1.
-            }
+            rewards = DEFAULT_REWARDS.copy()
         self.rewards = rewards
 
         self.max_steps = max_steps
@@ -52,36 +67,77 @@ class Frogger(PyGameWrapper):
         self.init_lives = lives
         self.num_arrived_frogs = num_arrived_frogs
         self.show_stats = show_stats
-        self.sound = sound
+        self.load_assets = load_assets
+
+        # without assets the game can only run its logic
+        self.sound = sound and load_assets
+        self.headless = headless or not load_assets
+
+        # actions are either read from the keyboard events in PyGame's queue, or set directly by the agent
+        self.keyboard_input = keyboard_input and load_assets
+        self.action_key = self.NOOP
+
+        # games draw in their own surface, copied to the display, dirty rendering tracking the blits of the last draw and
+        # the regions to update in the display and pixels
+        self.dirty_rendering = dirty_rendering
+        self.display = None
+        self.drawn_blits = None
+        self.display_rects = []
+        self.pixel_rects = None
+        self.screen_rgb = None
 
         self.key_pressed = INVALID_ACTION_KEY
         self.process_events = False
         self.game_init = False
+        self.frame_stale = True
 
         self.dead_counter = 0
         self.dead_object = None
 
+        # the frog's blit before collisions were checked, such that frogs are drawn where they were hit
+        self.frog_blit = None
+
         self.game = Game(self.init_speed, self.init_level, self.max_steps)
         self.frog = Frog(FROG_INIT_POS.copy(), None, self.init_lives, {}, self.game,
                          self._get_reward(NO_LIVES_RWD_ATTR))
 
-        self.cars = []
-        self.logs = []
         self.arrived_frogs = []
         self.ticks_cars = []
         self.ticks_logs = []
+        self.num_spawned = 0
+        self.rng_state = None  # rng state captured by snapshots, the rng is only used when initializing the game
+
+        # objects are stored per lane
+        self.cars_capacity, self.logs_capacity = get_lanes_capacity(self.init_speed, self.init_level)
+        self.car_lanes = [Lane(CARS_INIT_POS[i], CARS_SIZES[i], ACTION_RIGHT_KEY if i % 2 == 0 else ACTION_LEFT_KEY,
+                               CARS_SPEED_FACTORS[i], CARS_MIN_X, CARS_MAX_X, self.cars_capacity)
+                          for i in range(NUM_LANES)]
+        self.log_lanes = [Lane(LOGS_INIT_POS[i], LOG_SIZE, ACTION_RIGHT_KEY if i % 2 == 0 else ACTION_LEFT_KEY,
+                               1, LOGS_MIN_X, LOGS_MAX_X, self.logs_capacity)
+                          for i in range(NUM_LANES)]
+
+        # fixed observation buffer, reused across steps
+        self.fixed_obs = np.zeros(get_fixed_obs_size(self.cars_capacity, self.logs_capacity))
+        self._fixed_obs_views = get_fixed_obs_views(self.fixed_obs, self.cars_capacity, self.logs_capacity)
+
+        # grid observation buffer, incrementally updated
+        self.grid_obs = np.zeros(GRID_SHAPE, dtype=np.uint8)
+        self.grid_frog_cell = None
+        self.grid_lane_rows = [(lane, self.grid_obs[GRID_CARS_CHANNEL, lane.row]) for lane in self.car_lanes] + \
+                              [(lane, self.grid_obs[GRID_LOGS_CHANNEL, lane.row]) for lane in self.log_lanes]
 
         # declaration of graphical elements
         self.game_font = None
         self.info_font = None
+        self.hud_texts = {}
         self.menu_font = None
         self.background = None
         self.frog_sprites = {}
         self.sprite_arrived = None
         self.frog_life_sprite = None
-        self.sprites_drowned = []
-        self.sprites_time_up = []
-        self.sprites_crash = []
+        self.sprites_drowned = None
+        self.sprites_time_up = None
+        self.sprites_crash = None
         self.car_sprites = []
         self.log_sprite = None
         self.hit_sound = None
@@ -98,22 +154,41 @@ class Frogger(PyGameWrapper):
 
         self.dead_counter = 0
         self.dead_object = None
+        self.frog_blit = None
 
-        self.cars = []
-        self.logs = []
+        for lane in self.car_lanes + self.log_lanes:
+            lane.clear()
+        self.num_spawned = 0
         self.arrived_frogs = []
-        self.ticks_cars = [self.rng.randint(0, MAX_CAR_TICKS) for _ in range(5)]
-        self.ticks_logs = [self.rng.randint(0, MAX_LOG_TICK) for _ in range(5)]
-
-        self.game = Game(self.init_speed, self.init_level, self.max_steps)
-        self.frog = Frog(FROG_INIT_POS.copy(), self.frog_sprites[ACTION_UP_KEY], self.init_lives,
-                         self.frog_sprites, self.game, self._get_reward(NO_LIVES_RWD_ATTR))
+        self.ticks_cars = [self.rng.randint(0, MAX_CAR_TICKS) for _ in range(NUM_LANES)]
+        self.ticks_logs = [self.rng.randint(0, MAX_LOG_TICK) for _ in range(NUM_LANES)]
+        self.rng_state = None
+        self.grid_obs.fill(0)
+        self.grid_frog_cell = None
+
+        # game and frog are reset in place
+        self.game.reset(self.init_speed, self.init_level)
+        self.frog.reset(self.frog_sprites, self.init_lives)
+
+        # headless games only draw when pixels are requested
+        self.frame_stale = True
+        if not self.headless:
+            self.draw()
+            self.display.blit(self.screen, (0, 0))
+            pygame.display.flip()
+
+    @property
+    def cars(self):
+        return self._get_objects(self.car_lanes)
+
+    @property
+    def logs(self):
+        return self._get_objects(self.log_lanes)
 
-        self.screen.blit(self.background, (0, 0))
-        self.frog.draw(self.screen)
-        if self.show_stats:
-            self._draw_stats()
-        pygame.display.flip()
+    @staticmethod
+    def _get_objects(lanes):
+        # objects of all lanes sorted by spawn order
+        return sorted((obj for lane in lanes for obj in lane), key=lambda obj: obj.seq)
 
     def getScore(self):
         return self.game.points
@@ -129,33 +204,28 @@ class Frogger(PyGameWrapper):
                key == ACTION_DOWN_KEY or \
                key == ACTION_NO_MOVE_KEY
 
-    def step(self, dt):
+    def step(self, dt, draw=True):
 
         # ignore if game is over, needs re-init
         if self.game_over():
             return
 
-        # checks 'wait for key' state
-        if not self.frog.is_moving:
-            self.key_pressed = INVALID_ACTION_KEY
+        self.update(dt)
 
-        # processes events
-        if self.process_events:
-
-            self.process_events = False
-            for event in pygame.event.get():
-                if event.type == QUIT:
-                    exit()
-                if event.type == KEYDOWN and not self.frog.is_moving and self._is_valid_key(event.key):
-                    self.key_pressed = event.key
+        # headless games only draw when pixels are requested, the tick ending the game always being drawn
+        if not self.headless and (draw or self.game_over()):
+            self.draw()
 
-                    # sets new direction and locks frog movement
-                    if self.key_pressed != ACTION_NO_MOVE_KEY:
-                        self.frog.update_sprite(self.key_pressed)
-                        self.frog.is_moving = True
+    def update(self, dt):
+        """
+        Advances the game logic (spawning, movement, collisions and level progression) by one tick, without drawing.
+        :param float dt: the time elapsed since the last tick.
+        """
+        # ignore if game is over, needs re-init
+        if self.game_over():
+            return
 
-        # refreshes screen if needed
-        pygame.event.pump()
+        self._process_events()
 
         # checks max moves
         if self.game.steps == 0:
@@ -164,73 +234,490 @@ class Frogger(PyGameWrapper):
 
         self._create_cars()
         self._create_logs()
-
-        move_list(self.cars, self.game.speed)
-        move_list(self.logs, self.game.speed)
-
-        self.screen.blit(self.background, (0, 0))
-
-        draw_list(self.cars, self.screen)
-        draw_list(self.logs, self.screen)
-        draw_list(self.arrived_frogs, self.screen)
-
-        self.frog.move(self.key_pressed)
-        self.frog.animate()
-        self.frog.draw(self.screen)
-
+        self._move_objects()
         self._destroy_cars()
         self._destroy_logs()
 
+        self.frog_blit = self.frog.get_blit()
         self._check_frog_location()
         self._check_next_level()
 
-        # checks death image
+        # fades death image, kept until drawn with its last alpha
         if self.dead_counter > 0:
             self.dead_object.set_alpha(int(self.dead_counter / DEATH_IMAGE_TIME_STEPS * 255))
-            self.dead_object.draw(self.screen)
             self.dead_counter -= 1
-            if self.dead_counter == 0:
-                self.dead_object = None
+        else:
+            self.dead_object = None
+
+        self.frame_stale = True
+
+    def advance_traffic(self, n_ticks):
+        """
+        Fast-forwards the cars and logs by the given number of ticks, leaving the lanes and their spawn counters as
+        `update` would, but computing each lane in closed form instead of tick by tick, e.g., to fill the lanes of a new
+        game. The frog is neither carried by logs nor checked for collisions.
+        :param int n_ticks: the number of ticks to advance.
+        """
+        if n_ticks <= 0:
+            return
+
+        speed = self.game.speed
+        level = self.game.level
+        lanes = self.car_lanes + self.log_lanes
+        sprites = self.car_sprites + [self.log_sprite] * NUM_LANES
+        counters = self.ticks_cars + self.ticks_logs
+        init_ticks = CARS_INIT_TICKS + LOGS_INIT_TICKS
+
+        # only objects spawned in the last ticks are still in bounds
+        spawn_ticks = []
+        for i, lane in enumerate(lanes):
+            lane.move(speed * n_ticks)
+            for obj in lane.despawn():
+                if self.frog.log == obj:
+                    self.frog.log = None
+            step = abs(lane.dx) * speed
+            bound = lane.max_x - lane.init_x if lane.dx > 0 else lane.init_x - lane.min_x
+            start = max(1, n_ticks - int(bound // step) + 1) if step > 0 else 1
+            spawn_ticks.append(get_spawn_ticks(counters[i], init_ticks[i], speed, level, n_ticks, start))
+
+        # spawn orders follow the order of spawns in `update`, i.e., by tick, then cars' lanes before logs' lanes
+        ticks = np.concatenate(spawn_ticks)[:, None]
+        lane_idxs = np.repeat(np.arange(len(lanes)), [len(lane_ticks) for lane_ticks in spawn_ticks])[:, None]
+        before = count_spawns(counters, init_ticks, speed, level, ticks - 1)
+        same = count_spawns(counters, init_ticks, speed, level, ticks) - before
+        seqs = self.num_spawned + before.sum(axis=1) + (same * (np.arange(len(lanes)) < lane_idxs)).sum(axis=1)
+
+        k = 0
+        for i, lane in enumerate(lanes):
+            for tick in spawn_ticks[i]:
+                slot = lane.spawn(int(seqs[k]))
+                lane.set_x(slot, lane.init_x + lane.dx * speed * (n_ticks - int(tick) + 1))
+                lane.place(slot, Car if i < NUM_LANES else Log, sprites[i])
+                k += 1
+
+        # counters are decremented every tick and reset when spawning, decrements of positive counters being exact
+        num_spawns = count_spawns(counters, init_ticks, speed, level, n_ticks)
+        last_ticks = get_first_spawn_tick(counters) + (num_spawns - 1) * get_spawn_period(init_ticks, speed, level)
+        for i in range(len(lanes)):
+            if num_spawns[i] > 0:
+                counter, num = (init_ticks[i] * speed) / level, n_ticks - int(last_ticks[i])
+            else:
+                counter, num = counters[i], n_ticks
+            counter = counter if num == 0 else (counter - (num - 1)) - 1
+            if i < NUM_LANES:
+                self.ticks_cars[i] = counter
+            else:
+                self.ticks_logs[i - NUM_LANES] = counter
+
+        self.num_spawned += int(num_spawns.sum())
+        self.frog.log = None
+        self.frame_stale = True
+
+    def _process_events(self):
+
+        # checks 'wait for key' state
+        if not self.frog.is_moving:
+            self.key_pressed = INVALID_ACTION_KEY
+
+        # processes events
+        if self.process_events:
+
+            self.process_events = False
+            for key in self._get_keys_down():
+                if not self.frog.is_moving and self._is_valid_key(key):
+                    self.key_pressed = key
+
+                    # sets new direction and locks frog movement
+                    if self.key_pressed != ACTION_NO_MOVE_KEY:
+                        self.frog.update_sprite(self.key_pressed)
+                        self.frog.is_moving = True
+
+        # refreshes screen if needed
+        if self.keyboard_input:
+            pygame.event.pump()
+
+    def _move_objects(self):
+        for lane in self.car_lanes:
+            lane.move(self.game.speed)
+        for lane in self.log_lanes:
+            lane.move(self.game.speed)
+
+        self.frog.move(self.key_pressed)
+        self.frog.animate()
+
+    def draw(self):
+        """
+        Draws the current game state to the screen. With dirty rendering, only the regions where blits changed since the
+        last draw are restored from the background and redrawn.
+        """
+        blits = self._get_blits()
+        if not self.dirty_rendering or self.drawn_blits is None:
+            self.screen.blit(self.background, (0, 0))
+            for blit in blits:
+                self.screen.blit(*blit)
+            dirty_rects = [self.screen.get_rect()]
+        else:
+            dirty_rects = self._draw_dirty(blits)
+
+        if self.dirty_rendering:
+            self.drawn_blits = set(blits)
+            self.display_rects = self._add_dirty_rects(self.display_rects, dirty_rects)
+            if self.pixel_rects is not None:
+                self.pixel_rects = self._add_dirty_rects(self.pixel_rects, dirty_rects)
+
+        self.frame_stale = False
+
+    def _get_blits(self):
+        # the blits of all sprites over the background, in drawing order
+        blits = []
+        for lane in self.car_lanes:
+            blits.extend(car.get_blit() for car in lane)
+        for lane in self.log_lanes:
+            blits.extend(log.get_blit() for log in lane)
+        blits.extend(frog.get_blit() for frog in self.arrived_frogs)
+        blits.append(self.frog.get_blit() if self.frog_blit is None else self.frog_blit)
+
+        if self.dead_object is not None:
+            blits.append(self.dead_object.get_blit())
 
         # show stats
         if self.show_stats:
-            self._draw_stats()
+            blits.extend(self._get_stats_blits())
+        return blits
+
+    def _add_dirty_rects(self, rects, dirty_rects):
+        # regions pending update are replaced by the whole screen when there are too many of them
+        rects.extend(dirty_rects)
+        if len(rects) > MAX_DIRTY_RECTS:
+            return [self.screen.get_rect()]
+        return rects
+
+    def _draw_dirty(self, blits):
+        # redraws the regions of the blits that were added or removed since the last draw
+        screen = self.screen
+        screen_rect = screen.get_rect()
+        dirty_rects = []
+        for blit in self.drawn_blits.symmetric_difference(blits):
+            rect = get_blit_rect(blit).clip(screen_rect)
+            if rect.width > 0 and rect.height > 0:
+                dirty_rects.append(rect)
+        if len(dirty_rects) == 0:
+            return dirty_rects
+
+        dirty_rects = merge_rects(dirty_rects)
+        blit_rects = [get_blit_rect(blit) for blit in blits]
+        for rect in dirty_rects:
+            screen.set_clip(rect)
+            screen.blit(self.background, rect, rect)
+            for i in rect.collidelistall(blit_rects):
+                screen.blit(*blits[i])
+        screen.set_clip(None)
+        return dirty_rects
+
+    def getScreenRGB(self):
+        if not self.load_assets:
+            raise RuntimeError('Cannot render a game created without loading assets')
+
+        # draws lazily when running headless
+        if self.frame_stale and self.headless:
+            self.draw()
+        if not self.dirty_rendering:
+            return pygame.surfarray.array3d(self.screen)
+
+        # only copies the regions that changed since the last call
+        if self.pixel_rects is None:
+            self.screen_rgb = pygame.surfarray.array3d(self.screen)
+        else:
+            pixels = pygame.surfarray.pixels3d(self.screen)
+            for rect in merge_rects(self.pixel_rects):
+                self.screen_rgb[rect.left:rect.right, rect.top:rect.bottom] = \
+                    pixels[rect.left:rect.right, rect.top:rect.bottom]
+            del pixels
+        self.pixel_rects = []
+        return self.screen_rgb.copy()
+
+    def get_screen(self):
+        """
+        Gets the screen, drawing the current game state first if needed.
+        :return pygame.Surface: the screen surface.
+        """
+        if not self.load_assets:
+            raise RuntimeError('Cannot render a game created without loading assets')
+        if self.frame_stale:
+            self.draw()
+        return self.screen
+
+    def get_screen_view(self):
+        """
+        Gets the screen's pixels without copying them, drawing the current game state first if needed.
+        The screen is locked while the view is referenced, so it has to be released before the game is drawn again.
+        :return np.ndarray: a view of the screen's pixels of shape (HEIGHT, WIDTH, 3).
+        """
+        return pygame.surfarray.pixels3d(self.get_screen()).transpose(1, 0, 2)
 
     def _set_death_sprite(self, sprites):
-        # creates a new image object and resets counter
-        position = self.frog.position.copy()
+        # death images are only drawn
+        if not self.load_assets:
+            return
 
-        # checks to avoid out-of-bounds image
-        position[0] = max(0, min(WIDTH - sprites[0].get_width(), position[0]))
-        if MIN_Y_POS <= self.frog.position[1] < MAX_GRASS_Y_POS:
-            position[1] = min(MAX_GRASS_Y_POS - CELL_HEIGHT, position[1])
+        # creates a new image object and resets counter, checking to avoid out-of-bounds image
+        x = max(0, min(WIDTH - sprites.sprite.get_width(), self.frog.x))
+        y = self.frog.y
+        if MIN_Y_POS <= y < MAX_GRASS_Y_POS:
+            y = min(MAX_GRASS_Y_POS - CELL_HEIGHT, y)
 
-        self.dead_object = AlphaObject(position, sprites)
+        self.dead_object = AlphaObject([x, y], sprites)
         self.dead_counter = DEATH_IMAGE_TIME_STEPS
 
-    def _draw_stats(self):
-        level_text_info = self.info_font.render(
-            ('Level: {}'.format(self.game.level)), 1, (TXT_COLOR, TXT_COLOR, TXT_COLOR))
-        points_text_info = self.info_font.render(
-            ('Points: {}'.format(self.game.points)), 1, (TXT_COLOR, TXT_COLOR, TXT_COLOR))
-        moves_text_info = self.info_font.render(
-            ('Moves: {}'.format(self.game.steps)), 1, (TXT_COLOR, TXT_COLOR, TXT_COLOR))
-        # lives_text_info = self.info_font.render(
-        #     ('Lives: {}'.format(self.frog.lives)), 1, (TXT_COLOR, TXT_COLOR, TXT_COLOR))
-        self.screen.blit(level_text_info, (10, 520))
-        self.screen.blit(moves_text_info, (100, 520))
-        self.screen.blit(points_text_info, (220, 520))
-        # self.screen.blit(lives_text_info, (370, 520))
+    def _get_stats_blits(self):
+        blits = [(self._get_hud_text('Level', self.game.level), (10, 520), None),
+                 (self._get_hud_text('Moves', self.game.steps), (100, 520), None),
+                 (self._get_hud_text('Points', self.game.points), (220, 520), None)]
+        # blits.append((self._get_hud_text('Lives', self.frog.lives), (370, 520), None))
         for i in range(self.frog.lives - 1):
-            self.screen.blit(self.frog_life_sprite,
-                             (WIDTH - 4 - (i + 1) * (self.sprite_arrived.get_width() + 4), 513))
+            blits.append((self.frog_life_sprite,
+                          (WIDTH - 4 - (i + 1) * (self.sprite_arrived.get_width() + 4), 513), None))
+        return blits
+
+    def _get_hud_text(self, label, value):
+        # text is only rendered again when its value changes
+        text = '{}: {}'.format(label, value)
+        cached = self.hud_texts.get(label)
+        if cached is None or cached[0] != text:
+            cached = self.hud_texts[label] = (text, self.info_font.render(text, 1, (TXT_COLOR, TXT_COLOR, TXT_COLOR)))
+        return cached[1]
 
     def getGameState(self):
-        return FroggerState.from_game(
-            self.game, self.arrived_frogs, self.frog, self.cars, self.logs).to_observation()
+        game_state = FroggerState.from_game(self.game, self.arrived_frogs, self.frog, [], [])
+        game_state.car_infos = self._get_infos(self.car_lanes)
+        game_state.log_infos = self._get_infos(self.log_lanes)
+        return game_state.to_observation()
+
+    @staticmethod
+    def _get_infos(lanes):
+        # [x, y, width, height, dir] infos of all lanes' objects sorted by spawn order, read in bulk from the lanes
+        infos = []
+        for lane in lanes:
+            if lane.count == 0:
+                continue
+            xs = (lane.base_x + lane.offset).tolist()
+            seqs = lane.seq.tolist()
+            for i in range(lane.count):
+                slot = (lane.head + i) % lane.capacity
+                infos.append((seqs[slot], [xs[slot], lane.y, lane.width, lane.height, lane.way]))
+        infos.sort(key=lambda info: info[0])
+        return [info for _, info in infos]
+
+    def getFixedGameState(self):
+        """
+        Gets the fixed-size observation of the current game state, as given by `FroggerState.to_fixed_observation`.
+        :return np.ndarray: the observation, stored in a buffer that is reused across calls.
+        """
+        obs = self.fixed_obs
+        obs[0] = self.game.steps
+        obs[1] = self.game.level
+        obs[2] = self.game.points
+        obs[3] = self.game.death_idx
+        obs[4] = self.frog.lives
+        obs[5:10] = 0
+        for arrived_frog in self.arrived_frogs:
+            obs[5 + ARRIVAL_POSITIONS.index(arrived_frog.position[0])] = 1
+        obs[10] = self.frog.position[0]
+        obs[11] = self.frog.position[1]
+        obs[12] = self.frog.sprite.get_width() / ANIMATIONS_PER_MOVE
+        obs[13] = self.frog.sprite.get_height()
+        obs[14] = self.frog.way
+
+        cars, logs, cars_mask, logs_mask = self._fixed_obs_views
+        obs[OBS_HEADER_SIZE:] = 0
+        for i in range(NUM_LANES):
+            self.car_lanes[i].write_infos(cars[i], cars_mask[i])
+            self.log_lanes[i].write_infos(logs[i], logs_mask[i])
+        return obs
+
+    def getGridGameState(self):
+        """
+        Gets the grid observation of the current game state, as given by `FroggerState.to_grid_observation`. Lanes' rows
+        are only rewritten when their objects cross cells.
+        :return np.ndarray: the observation, stored in a buffer that is reused across calls.
+        """
+        grid = self.grid_obs
+        for lane, row in self.grid_lane_rows:
+            lane.write_row(row)
+
+        lilies = grid[GRID_LILIES_CHANNEL, 0]
+        lilies.fill(0)
+        for arrived_frog in self.arrived_frogs:
+            lilies[get_grid_col(arrived_frog.position[0], FROG_SIZE)] = 1
+
+        cell = (get_grid_row(self.frog.position[1], FROG_SIZE), get_grid_col(self.frog.position[0], FROG_SIZE))
+        if cell != self.grid_frog_cell:
+            if self.grid_frog_cell is not None:
+                grid[GRID_FROG_CHANNEL][self.grid_frog_cell] = 0
+            grid[GRID_FROG_CHANNEL][cell] = 1
+            self.grid_frog_cell = cell
+        return grid
+
+    def get_state_key(self):
+        """
+        Gets a canonical key of the current game position, in which objects are quantized to the cells of the grid
+        observations, e.g., for tabular or search agents. The key is made of the frog's cell, animation counter and
+        moving direction, the occupied lilies, the level and speed, and the cells covered by the objects of each lane,
+        which are only recomputed when objects cross cells.
+        :return tuple: the key, a tuple of ints that can be hashed and compared.
+        """
+        for lane, row in self.grid_lane_rows:
+            lane.write_row(row)
+
+        lilies = 0
+        for arrived_frog in self.arrived_frogs:
+            lilies |= 1 << get_grid_col(arrived_frog.position[0], FROG_SIZE)
+
+        frog = self.frog
+        return (get_grid_row(frog.position[1], FROG_SIZE), get_grid_col(frog.position[0], FROG_SIZE),
+                frog.animation_counter, frog.way if frog.is_moving else 0, lilies, self.game.level, self.game.speed) + \
+            tuple([lane.row_key for lane, _ in self.grid_lane_rows])
+
+    def set_fixed_obs_buffer(self, buffer):
+        """
+        Sets the buffer in which `getFixedGameState` writes the observations, e.g., a row of a shared memory array.
+        :param np.ndarray buffer: the float64 array of size `get_fixed_obs_size(cars_capacity, logs_capacity)`.
+        """
+        self.fixed_obs = buffer
+        self._fixed_obs_views = get_fixed_obs_views(buffer, self.cars_capacity, self.logs_capacity)
+
+    def snapshot(self):
+        """
+        Captures the complete simulation state of the game, including the lanes' objects, spawn ticks, frog movement and
+        RNG state, such that `restore` resumes the game exactly from this point. Snapshots hold no pygame surfaces and are
+        meant to be taken between steps, i.e., pending key events are not captured.
+        :return FroggerSnapshot: the snapshot of the current game state.
+        """
+        game = self.game
+        frog = self.frog
+
+        # frog's log is identified by its lane and order within the lane
+        frog_log = None
+        if frog.log is not None:
+            lane = frog.log.lane
+            frog_log = (self.log_lanes.index(lane), (frog.log.slot - lane.head) % lane.capacity)
+
+        if self.rng_state is None:
+            self.rng_state = self.rng.get_state()
+
+        dead = None
+        if self.dead_object is not None:
+            sprites = [self.sprites_drowned, self.sprites_time_up, self.sprites_crash]
+            dead = ([s is self.dead_object.sprites for s in sprites].index(True),
+                    tuple(self.dead_object.position), self.dead_object.alpha, self.dead_counter)
+
+        return FroggerSnapshot(
+            (game.speed, game.level, game.points, game.steps, game.death_idx),
+            (tuple(frog.position), frog.way, frog.lives, frog.animation_counter, frog.is_moving),
+            frog_log, self.key_pressed, self.process_events, dead,
+            tuple(arrived.position[0] for arrived in self.arrived_frogs),
+            tuple(self.ticks_cars), tuple(self.ticks_logs), self.num_spawned,
+            tuple(lane.snapshot() for lane in self.car_lanes),
+            tuple(lane.snapshot() for lane in self.log_lanes),
+            self.rng_state)
+
+    def restore(self, snap):
+        """
+        Restores the game to the state captured by `snapshot`, in time linear in the number of objects. The game must have
+        been initialized and created with the same parameters as the one from which the snapshot was taken.
+        :param FroggerSnapshot snap: the snapshot to restore.
+        """
+        game = self.game
+        game.speed, game.level, game.points, game.steps, game.death_idx = snap.game
+
+        frog = self.frog
+        position, way, frog.lives, frog.animation_counter, frog.is_moving = snap.frog
+        frog.position = list(position)
+        frog.way = way
+        frog.sprite = self.frog_sprites[way]
+
+        self.key_pressed = snap.key_pressed
+        self.process_events = snap.process_events
+        self.arrived_frogs = [Object([x, ARRIVAL_POSITION_Y], self.sprite_arrived, ACTION_DOWN_KEY)
+                              for x in snap.arrived_x]
+        self.ticks_cars = list(snap.ticks_cars)
+        self.ticks_logs = list(snap.ticks_logs)
+        self.num_spawned = snap.num_spawned
+        if snap.rng_state is not self.rng_state:
+            self.rng.set_state(snap.rng_state)
+            self.rng_state = snap.rng_state
+
+        for i, lane in enumerate(self.car_lanes):
+            lane.restore(*snap.car_lanes[i])
+            for slot in range(lane.count):
+                lane.place(slot, Car, self.car_sprites[i])
+        for i, lane in enumerate(self.log_lanes):
+            lane.restore(*snap.log_lanes[i])
+            for slot in range(lane.count):
+                lane.place(slot, Log, self.log_sprite)
+
+        # restored lanes store objects from the first slot
+        frog.log = None if snap.frog_log is None else self.log_lanes[snap.frog_log[0]].objects[snap.frog_log[1]]
+
+        self.dead_object = None
+        self.dead_counter = 0
+        self.frog_blit = None
+        if snap.dead is not None:
+            sprites_idx, position, alpha, self.dead_counter = snap.dead
+            sprites = [self.sprites_drowned, self.sprites_time_up, self.sprites_crash][sprites_idx]
+            self.dead_object = AlphaObject(list(position), sprites)
+            self.dead_object.set_alpha(alpha)
+
+        self.frame_stale = True
+        if not self.headless:
+            self.draw()
+
+    def _get_keys_down(self):
+        # actions set directly by the agent do not go through the event queue
+        if not self.keyboard_input:
+            return [self.action_key]
+        keys = []
+        for event in pygame.event.get():
+            if event.type == QUIT:
+                exit()
+            if event.type == KEYDOWN:
+                keys.append(event.key)
+        return keys
+
+    def _setup(self):
+        if self.load_assets:
+            super()._setup()
+        else:
+            self.clock = pygame.time.Clock()
+
+        # the display is shared by all games in the process, so each game draws in its own surface
+        if self.load_assets:
+            self.display = self.screen
+            self.screen = pygame.Surface(self.getScreenDims(), 0, self.display)
+        self.drawn_blits = None
+        self.pixel_rects = None
+
+    def _draw_frame(self, draw_screen):
+        # a displayed window still has to process its events when actions are set directly
+        if draw_screen and not self.keyboard_input:
+            pygame.event.pump()
+        if not self.dirty_rendering:
+            if draw_screen:
+                self.display.blit(self.screen, (0, 0))
+            super()._draw_frame(draw_screen)
+            return
+        if draw_screen:
+            rects = merge_rects(self.display_rects)
+            for rect in rects:
+                self.display.blit(self.screen, rect, rect)
+            pygame.display.update(rects)
+        self.display_rects = []
 
     def _setAction(self, action, last_action):
-        super()._setAction(action, last_action)
+        if self.keyboard_input:
+            super()._setAction(action, last_action)
+        else:
+            self.action_key = self.NOOP if action is None else action
         self.process_events = True
         self.game.steps -= 1
         self.game.points += self._get_reward(TICK_RWD_ATTR)
@@ -244,18 +731,12 @@ class Frogger(PyGameWrapper):
         return pygame.image.load(join(base_dir, img_path))
 
     @staticmethod
-    def _create_alpha_images(sprite):
-        # creates a list with copies of the given image with different global alphas
-        sprites = []
-        for a in range(256):
-            key = (0, 0, 0)
-            surface = pygame.Surface(sprite.get_size(), depth=24)
-            surface.fill(key, surface.get_rect())
-            surface.set_colorkey(key)
-            surface.blit(sprite, (0, 0))
-            surface.set_alpha(a)
-            sprites.append(surface)
-        return sprites
+    def _load_alpha_images(base_dir, img_path):
+        # alpha copies of images are shared by all games in the process
+        path = join(base_dir, img_path)
+        if path not in ALPHA_IMAGES:
+            ALPHA_IMAGES[path] = AlphaImages(pygame.image.load(path).convert_alpha())
+        return ALPHA_IMAGES[path]
 
     @staticmethod
     def _load_sound(base_dir, sound_path):
@@ -264,6 +745,9 @@ class Frogger(PyGameWrapper):
     def _init_resources(self):
         if self.game_init:
             return
+        if not self.load_assets:
+            self._init_sizes()
+            return
 
         # fonts
         font_name = pygame.font.get_default_font()
@@ -288,9 +772,9 @@ class Frogger(PyGameWrapper):
         self.sprite_arrived = self._load_img(_dir, 'images/frog_arrived.png').convert_alpha()
         self.frog_life_sprite = pygame.transform.rotate(self.sprite_arrived, 180)
 
-        self.sprites_drowned = self._create_alpha_images(self._load_img(_dir, 'images/splash.png').convert_alpha())
-        self.sprites_time_up = self._create_alpha_images(self._load_img(_dir, 'images/clock.png').convert_alpha())
-        self.sprites_crash = self._create_alpha_images(self._load_img(_dir, 'images/burst.png').convert_alpha())
+        self.sprites_drowned = self._load_alpha_images(_dir, 'images/splash.png')
+        self.sprites_time_up = self._load_alpha_images(_dir, 'images/clock.png')
+        self.sprites_crash = self._load_alpha_images(_dir, 'images/burst.png')
 
         sprite_car1 = self._load_img(_dir, 'images/car1.png').convert_alpha()
         sprite_car2 = self._load_img(_dir, 'images/car2.png').convert_alpha()
@@ -312,6 +796,15 @@ class Frogger(PyGameWrapper):
 
         self.game_init = True
 
+    def _init_sizes(self):
+        # the game logic only needs the sprites' sizes
+        self.frog_sprites = {key: SpriteSize(FROG_SHEET_SIZE)
+                             for key in [ACTION_UP_KEY, ACTION_DOWN_KEY, ACTION_LEFT_KEY, ACTION_RIGHT_KEY]}
+        self.sprite_arrived = SpriteSize(ARRIVED_FROG_SIZE)
+        self.car_sprites = [SpriteSize(size) for size in CARS_SIZES]
+        self.log_sprite = SpriteSize(LOG_SIZE)
+        self.game_init = True
+
     def _create_cars(self):
         for i, tick in enumerate(self.ticks_cars):
             self.ticks_cars[i] -= 1
@@ -320,14 +813,13 @@ class Frogger(PyGameWrapper):
 
             # adds a new car in this row
             self.ticks_cars[i] = (CARS_INIT_TICKS[i] * self.game.speed) / self.game.level
-            car = Car(CARS_INIT_POS[i].copy(), self.car_sprites[i], ACTION_RIGHT_KEY if i % 2 == 0 else ACTION_LEFT_KEY,
-                      CARS_SPEED_FACTORS[i])
-            self.cars.append(car)
+            lane = self.car_lanes[i]
+            lane.place(lane.spawn(self.num_spawned), Car, self.car_sprites[i])
+            self.num_spawned += 1
 
     def _destroy_cars(self):
-        for i in self.cars:
-            if i.position[0] < -80 or i.position[0] > 516:
-                self.cars.remove(i)
+        for lane in self.car_lanes:
+            lane.despawn()
 
     def _create_logs(self):
         for i, tick in enumerate(self.ticks_logs):
@@ -337,21 +829,22 @@ class Frogger(PyGameWrapper):
 
             # adds a new log in this row
             self.ticks_logs[i] = (LOGS_INIT_TICKS[i] * self.game.speed) / self.game.level
-            log = Log(LOGS_INIT_POS[i].copy(), self.log_sprite, ACTION_RIGHT_KEY if i % 2 == 0 else ACTION_LEFT_KEY)
-            self.logs.append(log)
+            lane = self.log_lanes[i]
+            lane.place(lane.spawn(self.num_spawned), Log, self.log_sprite)
+            self.num_spawned += 1
 
     def _destroy_logs(self):
-        for log in self.logs:
-            if log.position[0] < -100 or log.position[0] > 448:
+        for lane in self.log_lanes:
+            for log in lane.despawn():
                 if self.frog.log == log:
                     self.frog.log = None
-                self.logs.remove(log)
 
     def _frog_on_the_road(self):
-        frog_rect = self.frog.rect()
-        for car in self.cars:
-            car_rect = car.rect()
-            if frog_rect.colliderect(car_rect):
+        # only lanes overlapping the frog's rows are checked
+        rect_x = int(self.frog.position[0])
+        rect_y = int(self.frog.position[1])
+        for lane in self.car_lanes:
+            if lane.collide(rect_x, rect_y, FROG_SIZE) is not None:
                 if self.sound:
                     self.hit_sound.play()
                 self._set_death_sprite(self.sprites_crash)
@@ -364,15 +857,14 @@ class Frogger(PyGameWrapper):
         if self.frog.log is not None:
             return
 
-        # checks for collision with any log (frog is safe)
-        frog_rect = self.frog.rect()
-        safe = False
-        for log in self.logs:
-            log_rect = log.rect()
-            if frog_rect.colliderect(log_rect):
-                safe = True
+        # checks for collision with the earliest spawned log (frog is safe)
+        rect_x = int(self.frog.position[0])
+        rect_y = int(self.frog.position[1])
+        for lane in self.log_lanes:
+            log = lane.collide(rect_x, rect_y, FROG_SIZE)
+            if log is not None and (self.frog.log is None or log.seq < self.frog.log.seq):
                 self.frog.log = log
-                break
+        safe = self.frog.log is not None
 
         # checks frog out-of-bounds (assume fell on water)
         safe = safe and - FROG_SIZE < self.frog.position[0] < WIDTH
@@ -384,16 +876,19 @@ class Frogger(PyGameWrapper):
             self._set_death_sprite(self.sprites_drowned)
             self.frog.set_dead(self._get_reward(HIT_WATER_RWD_ATTR), WATER_DEATH_IDX)
 
-    def _occupied(self, position):
-        return any([fg.position == position for fg in self.arrived_frogs])
+    def _occupied(self, arrival_x):
+        # arrived frogs are all at the same height
+        for fg in self.arrived_frogs:
+            if fg.x == arrival_x:
+                return True
+        return False
 
     def _check_frog_arrived(self):
         # checks if frog jumps to any lily pad
+        frog_x = self.frog.x
         for arrival_x in ARRIVAL_POSITIONS:
-            arrive_pos = [arrival_x, ARRIVAL_POSITION_Y]
-            if not self._occupied(arrive_pos) and \
-                    arrival_x - ARRIVAL_WIDTH < self.frog.position[0] < arrival_x + ARRIVAL_WIDTH:
-                self._create_arrived(arrive_pos)
+            if arrival_x - ARRIVAL_WIDTH < frog_x < arrival_x + ARRIVAL_WIDTH and not self._occupied(arrival_x):
+                self._create_arrived([arrival_x, ARRIVAL_POSITION_Y])
                 return
 
         # otherwise put's frog back in log
@@ -440,28 +935,91 @@ class Frogger(PyGameWrapper):
 
 
 class Object(object):
+    __slots__ = ('sprite', 'position', 'way')
+
     def __init__(self, position, sprite, way):
         self.sprite = sprite
         self.position = position
         self.way = way
 
+    @property
+    def x(self):
+        return self.position[0]
+
+    @property
+    def y(self):
+        return self.position[1]
+
     def draw(self, screen):
-        screen.blit(self.sprite, tuple(self.position))
+        screen.blit(*self.get_blit())
+
+    def get_blit(self):
+        # the arguments of the blit drawing this object
+        return self.sprite, tuple(self.position), None
 
     def rect(self):
         return Rect(self.position[0], self.position[1], self.sprite.get_width(), self.sprite.get_height())
 
 
+class SpriteSize(object):
+    """
+    Stands for a sprite of the given size when running the game without loading its images.
+    """
+    __slots__ = ('size',)
+
+    def __init__(self, size):
+        self.size = tuple(size)
+
+    def get_size(self):
+        return self.size
+
+    def get_width(self):
+        return self.size[0]
+
+    def get_height(self):
+        return self.size[1]
+
+
+class AlphaImages(object):
+    """
+    Copies of an image with different global alphas, indexed by alpha and created the first time they are used.
+    """
+    __slots__ = ('sprite', 'surfaces')
+
+    def __init__(self, sprite):
+        self.sprite = sprite
+        self.surfaces = {}
+
+    def __getitem__(self, alpha):
+        surface = self.surfaces.get(alpha)
+        if surface is None:
+            key = (0, 0, 0)
+            surface = pygame.Surface(self.sprite.get_size(), depth=24)
+            surface.fill(key, surface.get_rect())
+            surface.set_colorkey(key)
+            surface.blit(self.sprite, (0, 0))
+            surface.set_alpha(alpha)
+            self.surfaces[alpha] = surface
+        return surface
+
+
 class AlphaObject(Object):
+    __slots__ = ('sprites', 'alpha')
+
     def __init__(self, position, sprites):
         super().__init__(position, sprites[255], ACTION_DOWN_KEY)
         self.sprites = sprites
+        self.alpha = 255
 
     def set_alpha(self, alpha):
+        self.alpha = alpha
         self.sprite = self.sprites[alpha]
 
 
 class Frog(Object):
+    __slots__ = ('frog_sprites', 'lives', 'game', 'no_lives_rwd', 'animation_counter', 'is_moving', 'log',
+                 'init_position')
+
     def __init__(self, position, sprite, lives, frog_sprites, game, death_rwd):
         super().__init__(position, sprite, ACTION_UP_KEY)
         self.frog_sprites = frog_sprites
@@ -528,40 +1086,319 @@ class Frog(Object):
         self.log = None
 
     def set_to_initial_position(self):
-        self.position = self.init_position.copy()
+        self.position[0], self.position[1] = self.init_position
 
-    def draw(self, screen):
+    def reset(self, frog_sprites, lives):
+        self.frog_sprites = frog_sprites
+        self.sprite = frog_sprites[ACTION_UP_KEY]
+        self.way = ACTION_UP_KEY
+        self.lives = lives
+        self.set_to_initial_position()
+        self.animation_counter = 0
+        self.is_moving = False
+        self.log = None
+
+    def get_blit(self):
         current_sprite = self.animation_counter * FROG_SIZE
-        screen.blit(self.sprite, tuple(self.position), (current_sprite, 0, FROG_SIZE, FROG_SIZE + current_sprite))
+        return self.sprite, tuple(self.position), (current_sprite, 0, FROG_SIZE, FROG_SIZE + current_sprite)
 
     def rect(self):
         return Rect(self.position[0], self.position[1], FROG_SIZE, FROG_SIZE)
 
 
-class Car(Object):
-    def __init__(self, position, sprite, way, factor):
-        super().__init__(position, sprite, way)
-        self.factor = factor
+class Lane(object):
+    """
+    Ring buffer holding the objects (cars or logs) that move along a lane. All objects in a lane move at the same speed,
+    so they are despawned in the same order they were spawned, and their horizontal positions are stored in an array
+    relative to the lane's displacement, such that moving the lane does not require updating each object.
+    """
+
+    def __init__(self, init_pos, size, way, factor, min_x, max_x, capacity):
+        """
+        Creates a new empty lane.
+        :param list init_pos: the position at which objects are spawned.
+        :param tuple size: the width and height of the lane's objects.
+        :param int way: the direction key of the lane's objects.
+        :param int factor: the factor multiplying the game speed for the lane's objects.
+        :param int min_x: the minimal horizontal position of an object before being despawned.
+        :param int max_x: the maximal horizontal position of an object before being despawned.
+        :param int capacity: the initial maximal number of objects in the lane.
+        """
+        self.init_x, self.y = init_pos
+        self.width, self.height = size
+        self.way = way
+        self.dx = factor if way == ACTION_RIGHT_KEY else -factor
+        self.min_x = min_x
+        self.max_x = max_x
+        self.capacity = capacity
+        self.static_info = np.array([self.y, self.width, self.height, self.way], dtype=np.float64)
+        self.offset = 0.
+        self.head_x = 0.  # cached base position of the oldest object
+        self.base_x = np.zeros(capacity)
+        self.seq = np.zeros(capacity, dtype=np.int64)
+        self.objects = [None] * capacity
+        self.head = 0
+        self.count = 0
+        self.free = []  # objects removed from the lane, reused by later spawns
+
+        # the lane's grid row only changes when an object crosses a cell, i.e., after the lane moves by the row's slack
+        self.row = get_grid_row(self.y, self.height)
+        self.row_offset = 0.
+        self.row_slack = None
+        self.row_key = 0  # bitmask of the row's occupied cells, column i being bit i
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self.objects[(self.head + i) % self.capacity]
+
+    def get_x(self, slot):
+        return self.base_x[slot] + self.offset
+
+    def get_xs(self):
+        """
+        Gets the horizontal positions of the lane's objects.
+        :return np.ndarray: the positions, oldest first.
+        """
+        return self._ordered_base_x(self.count) + self.offset
+
+    def set_x(self, slot, x):
+        self.base_x[slot] = x - self.offset
+        self.row_slack = None
+        if slot == self.head:
+            self.head_x = float(self.base_x[slot])
+
+    def clear(self):
+        self.free.extend(self)
+        self.objects = [None] * self.capacity
+        self.offset = 0.
+        self.head = 0
+        self.count = 0
+        self.row_slack = None
+
+    def snapshot(self):
+        """
+        Gets the lane's displacement and the base positions and spawn orders of its objects, oldest first.
+        :return tuple: a tuple (offset, base_x, seq) that can be passed to `restore`.
+        """
+        return self.offset, self._ordered_base_x(self.count).copy(), self._ordered_seq(self.count).copy()
+
+    def restore(self, offset, base_x, seq):
+        """
+        Restores the lane state given by `snapshot`, leaving the objects list to be filled from the first slot.
+        :param float offset: the lane's displacement.
+        :param np.ndarray base_x: the base positions of the lane's objects, oldest first.
+        :param np.ndarray seq: the spawn orders of the lane's objects, oldest first.
+        """
+        count = len(base_x)
+        while self.capacity < count:
+            self.capacity *= 2
+            self.base_x = np.zeros(self.capacity)
+            self.seq = np.zeros(self.capacity, dtype=np.int64)
+        self.free.extend(self)
+        self.objects = [None] * self.capacity
+        self.offset = offset
+        self.base_x[:count] = base_x
+        self.seq[:count] = seq
+        self.head = 0
+        self.count = count
+        self.row_slack = None
+        if count > 0:
+            self.head_x = float(base_x[0])
+
+    def spawn(self, seq):
+        """
+        Adds a new object at the end of the lane, at the lane's initial position.
+        :param int seq: the spawn order of the new object.
+        :return int: the slot of the new object.
+        """
+        if self.count == self.capacity:
+            self._grow()
+        slot = (self.head + self.count) % self.capacity
+        self.base_x[slot] = self.init_x - self.offset
+        self.seq[slot] = seq
+        if self.count == 0:
+            self.head_x = float(self.base_x[slot])
+        self.count += 1
+        self.row_slack = None
+        return slot
+
+    def despawn(self):
+        """
+        Removes the objects that went out of bounds, which can only be the oldest ones, keeping them for reuse.
+        :return list: the removed objects.
+        """
+        removed = []
+        while self.count > 0 and not self.min_x <= self.head_x + self.offset <= self.max_x:
+            removed.append(self.objects[self.head])
+            self.free.append(self.objects[self.head])
+            self.objects[self.head] = None
+            self.head = (self.head + 1) % self.capacity
+            self.count -= 1
+            self.row_slack = None
+            if self.count > 0:
+                self.head_x = float(self.base_x[self.head])
+        return removed
+
+    def place(self, slot, obj_type, sprite):
+        """
+        Places an object in the given slot, reusing an object previously removed from the lane if possible.
+        :param int slot: the slot of the object, as given by `spawn`.
+        :param type obj_type: the class of the object, instantiated if no removed objects can be reused.
+        :param sprite: the sprite of the object.
+        :return LaneObject: the placed object.
+        """
+        if len(self.free) > 0:
+            obj = self.free.pop()
+            obj.slot = slot
+        else:
+            obj = obj_type(self, slot, sprite)
+        self.objects[slot] = obj
+        return obj
 
     def move(self, speed):
-        if self.way == ACTION_RIGHT_KEY:
-            self.position[0] += speed * self.factor
-        elif self.way == ACTION_LEFT_KEY:
-            self.position[0] -= speed * self.factor
+        self.offset += self.dx * speed
+
+    def collide(self, rect_x, rect_y, size):
+        """
+        Gets the oldest object colliding with the given square, as `pygame.Rect.colliderect` does.
+        :param int rect_x: the horizontal position of the square.
+        :param int rect_y: the vertical position of the square.
+        :param int size: the size of the square.
+        :return Object: the oldest colliding object, or `None` if no object collides with the square.
+        """
+        if self.count == 0 or not (rect_y < self.y + self.height and self.y < rect_y + size):
+            return None
+        obj_x = np.trunc(self._ordered_base_x(self.count) + self.offset)
+        collide = (rect_x < obj_x + self.width) & (obj_x < rect_x + size)
+        i = collide.argmax()
+        if not collide[i]:
+            return None
+        return self.objects[(self.head + i) % self.capacity]
+
+    def write_infos(self, out, mask_out):
+        """
+        Writes the [x, y, width, height, dir] info of the lane's objects, oldest first, discarding exceeding objects.
+        :param np.ndarray out: the array of shape (capacity, 5) in which to write the infos.
+        :param np.ndarray mask_out: the array of shape (capacity,) in which to flag the written slots.
+        """
+        num = min(self.count, len(mask_out))
+        if num == 0:
+            return
+        np.add(self._ordered_base_x(num), self.offset, out=out[:num, 0])
+        out[:num, 1:] = self.static_info
+        mask_out[:num] = 1
+
+    def write_row(self, row):
+        """
+        Writes the cells occupied by the lane's objects in the given grid row, only if they changed since the last write.
+        :param np.ndarray row: the lane's row of the grid observation, in which only this lane writes.
+        """
+        if self.row_slack is not None and abs(self.offset - self.row_offset) < self.row_slack:
+            return
 
+        # the slack is the minimal distance for an object's edge to cross a cell in the lane's direction
+        left = np.trunc(self._ordered_base_x(self.count) + self.offset)
+        right = left + (self.width - 1)
+        first = left // CELL_WIDTH
+        last = right // CELL_WIDTH
+        cells = ((GRID_COLS >= first[:, None]) & (GRID_COLS <= last[:, None])).any(axis=0)
+        row[:] = cells
+        self.row_key = int(cells @ GRID_COL_BITS)
+        edges = np.concatenate([left, right]) % CELL_WIDTH
+        slack = (CELL_WIDTH - edges).min(initial=CELL_WIDTH) if self.dx > 0 else (edges + 1).min(initial=CELL_WIDTH)
+        self.row_offset = self.offset
+        self.row_slack = slack
+
+    def _ordered_base_x(self, num):
+        # base positions of the oldest objects, in spawn order
+        end = self.head + num
+        if end <= self.capacity:
+            return self.base_x[self.head:end]
+        return self.base_x[(self.head + np.arange(num)) % self.capacity]
+
+    def _ordered_seq(self, num):
+        # spawn orders of the oldest objects
+        end = self.head + num
+        if end <= self.capacity:
+            return self.seq[self.head:end]
+        return self.seq[(self.head + np.arange(num)) % self.capacity]
+
+    def _grow(self):
+        # doubles the capacity, moving objects to the start of the buffers
+        order = (self.head + np.arange(self.count)) % self.capacity
+        objects = [self.objects[slot] for slot in order]
+        self.capacity *= 2
+        self.base_x = np.concatenate([self.base_x[order], np.zeros(self.capacity - self.count)])
+        self.seq = np.concatenate([self.seq[order], np.zeros(self.capacity - self.count, dtype=np.int64)])
+        self.objects = objects + [None] * (self.capacity - self.count)
+        self.head = 0
+        for slot, obj in enumerate(objects):
+            obj.slot = slot
+
+
+class LaneObject(Object):
+    __slots__ = ('lane', 'slot')
+
+    def __init__(self, lane, slot, sprite):
+        # position is stored in the lane
+        self.lane = lane
+        self.slot = slot
+        self.sprite = sprite
+        self.way = lane.way
 
-class Log(Object):
-    def __init__(self, position, sprite, way):
-        super().__init__(position, sprite, way)
+    @property
+    def x(self):
+        return self.lane.get_x(self.slot)
+
+    @property
+    def y(self):
+        return self.lane.y
+
+    @property
+    def position(self):
+        # kept for compatibility, creating a new list at each access unlike `x` and `y`
+        return [self.lane.get_x(self.slot), self.lane.y]
+
+    def get_blit(self):
+        return self.sprite, (self.lane.get_x(self.slot), self.lane.y), None
+
+    def rect(self):
+        lane = self.lane
+        return Rect(lane.base_x[self.slot] + lane.offset, lane.y, lane.width, lane.height)
+
+    @position.setter
+    def position(self, position):
+        self.lane.set_x(self.slot, position[0])
+
+    @property
+    def seq(self):
+        return self.lane.seq[self.slot]
 
     def move(self, speed):
-        if self.way == ACTION_RIGHT_KEY:
-            self.position[0] += speed
-        elif self.way == ACTION_LEFT_KEY:
-            self.position[0] -= speed
+        self.lane.set_x(self.slot, self.lane.get_x(self.slot) + self.lane.dx * speed)
+
+
+class Car(LaneObject):
+    __slots__ = ('factor',)
+
+    def __init__(self, lane, slot, sprite):
+        super().__init__(lane, slot, sprite)
+        self.factor = abs(lane.dx)
+
+
+class Log(LaneObject):
+    __slots__ = ()
+
+    def __init__(self, lane, slot, sprite):
+        super().__init__(lane, slot, sprite)
 
 
 class Game(object):
+    __slots__ = ('speed', 'level', 'points', 'steps', 'max_steps', 'death_idx')
+
     def __init__(self, speed, level, max_steps):
         self.speed = speed
         self.level = level
@@ -571,3 +1408,10 @@ class Game(object):
 
     def reset_steps(self):
         self.steps = self.max_steps
+
+    def reset(self, speed, level):
+        self.speed = speed
+        self.level = level
+        self.points = 0
+        self.steps = self.max_steps
+        self.death_idx = NOT_DEAD_IDX
@@ -0,0 +1,133 @@
+__author__ = 'Pedro Sequeira'
+
+import numpy as np
+from time import perf_counter_ns
+
+# phases of a game tick and of an environment step, by name, and the methods timed for them
+GAME_PHASES = [('update', 'update'),
+               ('events', '_process_events'),
+               ('create_cars', '_create_cars'),
+               ('create_logs', '_create_logs'),
+               ('move', '_move_objects'),
+               ('destroy_cars', '_destroy_cars'),
+               ('destroy_logs', '_destroy_logs'),
+               ('check_frog', '_check_frog_location'),
+               ('draw', 'draw'),
+               ('stats', '_get_stats_blits')]
+ENV_PHASES = [('observation', '_get_obs'),
+              ('capture', '_capture_frame')]
+DRIVER_PHASES = [('draw_frame', '_draw_frame')]
+
+# durations histograms have power-of-two nanosecond buckets, the last one holding all longer durations
+NUM_HIST_BUCKETS = 40
+
+
+class PhaseProfiler(object):
+    """
+    Times the phases of a Frogger game's ticks and of a `frogger.gym.FroggerEnv`'s steps, e.g., spawning, moving and
+    drawing objects, or computing observations. The profiler replaces the phases' methods in the attached instances
+    by timed ones, so instances that are not attached run their methods as they are, with no overhead.
+    For each phase, it keeps the number of calls, the total time and a histogram of the durations, where bucket `i`
+    counts durations in [2^(i-1), 2^i) nanoseconds. Nested phases, e.g., `stats` within `draw`, are timed in both.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.totals = {}
+        self.histograms = {}
+        self.step_times = {}
+        self._patched = []
+
+    def attach(self, obj):
+        """
+        Starts timing the phases of a game or environment.
+        :param obj: the `frogger.ple.Frogger` game, or the `frogger.gym.FroggerEnv`, in which case the phases of its game
+        and game driver are also timed.
+        :return PhaseProfiler: this profiler.
+        """
+        if hasattr(obj, 'game_state'):
+            self._patch(obj, ENV_PHASES)
+            self._patch(obj.game_state, DRIVER_PHASES)
+            obj = obj.game_state.game
+        self._patch(obj, GAME_PHASES)
+        return self
+
+    def detach(self):
+        """
+        Stops timing, restoring the methods of all attached instances.
+        """
+        for obj, name, original in reversed(self._patched):
+            if original is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, original)
+        self._patched = []
+
+    def reset(self):
+        """
+        Clears all timings.
+        """
+        self.counts.clear()
+        self.totals.clear()
+        self.histograms.clear()
+        self.step_times.clear()
+
+    def pop_step_times(self):
+        """
+        Gets the time spent in each phase since the last call, e.g., during an environment step, clearing those times.
+        :return dict: the seconds spent in each phase.
+        """
+        step_times = {phase: ns * 1e-9 for phase, ns in self.step_times.items()}
+        self.step_times.clear()
+        return step_times
+
+    def get_stats(self):
+        """
+        Gets the cumulative timings of each phase.
+        :return dict: for each phase, a dictionary with the number of calls (`count`), total and mean seconds (`total`
+        and `mean`), and the durations' histogram (`histogram`).
+        """
+        return {phase: {'count': count,
+                        'total': self.totals[phase] * 1e-9,
+                        'mean': self.totals[phase] * 1e-9 / count,
+                        'histogram': self.histograms[phase].copy()}
+                for phase, count in self.counts.items()}
+
+    def format_stats(self):
+        """
+        Gets a table with the cumulative timings of each phase, slowest first.
+        :return str: the table, with a row per phase.
+        """
+        rows = ['{:<14} {:>10} {:>12} {:>12}'.format('phase', 'calls', 'total ms', 'mean us')]
+        for phase, stats in sorted(self.get_stats().items(), key=lambda item: -item[1]['total']):
+            rows.append('{:<14} {:>10} {:>12.2f} {:>12.2f}'.format(
+                phase, stats['count'], stats['total'] * 1e3, stats['mean'] * 1e6))
+        return '\n'.join(rows)
+
+    def _patch(self, obj, phases):
+        for phase, name in phases:
+            self._patched.append((obj, name, obj.__dict__.get(name)))
+            setattr(obj, name, self._timed(phase, getattr(obj, name)))
+
+    def _timed(self, phase, method):
+        counts = self.counts
+        totals = self.totals
+        histograms = self.histograms
+        step_times = self.step_times
+
+        def timed(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = perf_counter_ns() - start
+                if phase not in counts:
+                    counts[phase] = 0
+                    totals[phase] = 0
+                    histograms[phase] = np.zeros(NUM_HIST_BUCKETS, dtype=np.int64)
+                counts[phase] += 1
+                totals[phase] += elapsed
+                histograms[phase][min(elapsed.bit_length(), NUM_HIST_BUCKETS - 1)] += 1
+                step_times[phase] = step_times.get(phase, 0) + elapsed
+
+        return timed
@@ -0,0 +1,263 @@
+__author__ = 'Pedro Sequeira'
+
+import os
+import sys
+import json
+import queue
+import threading
+import pygame
+import numpy as np
+from os.path import join
+
+RAW_FORMAT = 'raw'
+PNG_FORMAT = 'png'
+
+BLOCK_POLICY = 'block'
+DROP_NEWEST_POLICY = 'drop_newest'
+DROP_OLDEST_POLICY = 'drop_oldest'
+
+EPISODE_NAME_FORMAT = 'episode-{:06d}'
+FRAME_NAME_FORMAT = 'frame-{:06d}.png'
+
+
+def load_raw_frames(path):
+    """
+    Loads the frames of an episode recorded in the raw format without reading them into memory.
+    :param str path: the path to the episode's raw file.
+    :return np.ndarray: a memory map of the frames, of shape (num_frames, height, width, 3).
+    """
+    with open(os.path.splitext(path)[0] + '.json') as file:
+        info = json.load(file)
+    shape = (info['num_frames'],) + tuple(info['frame_shape'])
+    if info['num_frames'] == 0:
+        return np.zeros(shape, dtype=info['dtype'])
+    return np.memmap(path, dtype=info['dtype'], mode='r', shape=shape)
+
+
+class FrameRecorder(object):
+    """
+    Records frames to disk from a background thread. Frames are copied into a bounded pool of preallocated buffers and
+    written by the worker thread, either appended to a raw file per episode, with its metadata in a json file, or as a
+    sequence of png images per episode, neither requiring an external encoder. Episodes without frames are not written.
+    When all buffers are waiting to be written, the drop policy either blocks until one is written, drops the new frame,
+    or drops the oldest pending frame.
+    """
+
+    def __init__(self, out_dir, format=RAW_FORMAT, max_pending=64, drop_policy=BLOCK_POLICY, fps=None):
+        """
+        Creates a new recorder and starts its worker thread.
+        :param str out_dir: the directory in which to write the episodes.
+        :param str format: the format in which frames are written, either `'raw'` or `'png'`.
+        :param int max_pending: the maximum number of frames copied but not yet written.
+        :param str drop_policy: what to do with new frames when `max_pending` frames are pending, either `'block'`,
+        `'drop_newest'` or `'drop_oldest'`.
+        :param int fps: the frame rate stored in the raw episodes' metadata.
+        """
+        if format not in (RAW_FORMAT, PNG_FORMAT):
+            raise ValueError('Unknown recording format: {}'.format(format))
+        if drop_policy not in (BLOCK_POLICY, DROP_NEWEST_POLICY, DROP_OLDEST_POLICY):
+            raise ValueError('Unknown drop policy: {}'.format(drop_policy))
+        if max_pending < 1:
+            raise ValueError('Maximum number of pending frames has to be positive: {}'.format(max_pending))
+        os.makedirs(out_dir, exist_ok=True)
+
+        self.out_dir = out_dir
+        self.format = format
+        self.max_pending = max_pending
+        self.drop_policy = drop_policy
+        self.fps = fps
+        self.num_episodes = 0
+        self.num_frames = 0
+        self.num_dropped = 0
+        self.closed = False
+
+        # buffers are allocated lazily with the shape of the first frame
+        self._buffers = None
+        self._free = queue.Queue()
+        self._pending = queue.Queue()
+        self._error = None
+        self._thread = threading.Thread(target=self._write_frames, daemon=True)
+        self._thread.start()
+
+    def new_episode(self):
+        """
+        Starts a new episode, whose frames are written to new files.
+        """
+        self.num_episodes += 1
+
+    def record(self, frame):
+        """
+        Copies a frame to be written by the worker thread, blocking or dropping frames according to the drop policy if
+        too many frames are pending.
+        :param np.ndarray frame: the frame of shape (height, width, 3).
+        :return bool: whether the frame was recorded, `False` if it was dropped.
+        """
+        self._check_error()
+        if self.num_episodes == 0:
+            self.new_episode()
+        if self._buffers is None:
+            self._buffers = [np.empty(frame.shape, dtype=np.uint8) for _ in range(self.max_pending)]
+            for buffer in self._buffers:
+                self._free.put(buffer)
+
+        buffer = self._get_buffer()
+        if buffer is None:
+            self.num_dropped += 1
+            return False
+        np.copyto(buffer, frame)
+        self._pending.put((self.num_episodes, buffer, None))
+        self.num_frames += 1
+        return True
+
+    def record_surface(self, surface):
+        """
+        Copies the pixels of a surface to be written by the worker thread, as in `record`. The pixels of 32-bit surfaces
+        are copied as they are stored, being converted to RGB by the worker thread.
+        :param pygame.Surface surface: the surface to be recorded.
+        :return bool: whether the frame was recorded, `False` if it was dropped.
+        """
+        if surface.get_bytesize() != 4:
+            return self.record(pygame.surfarray.pixels3d(surface).transpose(1, 0, 2))
+
+        self._check_error()
+        if self.num_episodes == 0:
+            self.new_episode()
+        if self._buffers is None:
+            self._buffers = [np.empty((surface.get_height(), surface.get_width()), dtype=np.uint32)
+                             for _ in range(self.max_pending)]
+            for buffer in self._buffers:
+                self._free.put(buffer)
+
+        buffer = self._get_buffer()
+        if buffer is None:
+            self.num_dropped += 1
+            return False
+        np.copyto(buffer, pygame.surfarray.pixels2d(surface).T)
+
+        # byte of each of the RGB channels in the pixels
+        channels = [shift // 8 if sys.byteorder == 'little' else 3 - shift // 8 for shift in surface.get_shifts()[:3]]
+        self._pending.put((self.num_episodes, buffer, channels))
+        self.num_frames += 1
+        return True
+
+    def close(self):
+        """
+        Waits for all pending frames to be written and stops the worker thread.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self._pending.put(None)
+        self._thread.join()
+        self._check_error()
+
+    def __del__(self):
+        if hasattr(self, 'closed'):
+            self.close()
+
+    def _get_buffer(self):
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        if self.drop_policy == DROP_NEWEST_POLICY:
+            return None
+        if self.drop_policy == DROP_OLDEST_POLICY:
+            # reuses the buffer of the oldest frame not yet taken by the worker, if any
+            try:
+                _, buffer, _ = self._pending.get_nowait()
+                self.num_dropped += 1
+                self.num_frames -= 1
+                return buffer
+            except queue.Empty:
+                pass
+        return self._free.get()
+
+    def _check_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError('Error writing frames') from error
+
+    def _write_frames(self):
+        writer = None
+        episode = None
+        try:
+            while True:
+                item = self._pending.get()
+                if item is None:
+                    break
+                try:
+                    if item[0] != episode:
+                        if writer is not None:
+                            writer.close()
+                            writer = None
+                        episode = item[0]
+                        writer = self._create_writer(episode)
+                    frame, channels = item[1:]
+                    if channels is not None:
+                        frame = frame.view(np.uint8).reshape(frame.shape + (4,))[..., channels]
+                    writer.write(frame)
+                finally:
+                    self._free.put(item[1])
+        except Exception as e:
+            # keeps freeing buffers such that recording does not block, the error being raised on the next record
+            self._error = e
+            while True:
+                item = self._pending.get()
+                if item is None:
+                    break
+                self._free.put(item[1])
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def _create_writer(self, episode):
+        path = join(self.out_dir, EPISODE_NAME_FORMAT.format(episode))
+        if self.format == RAW_FORMAT:
+            return RawEpisodeWriter(path, self.fps)
+        return PngEpisodeWriter(path)
+
+
+class RawEpisodeWriter(object):
+    """
+    Appends the frames of an episode to a raw file, writing their shape, type and number to a json file when closed.
+    """
+
+    def __init__(self, path, fps=None):
+        self.path = path
+        self.fps = fps
+        self.file = open(path + '.raw', 'wb')
+        self.frame_shape = None
+        self.num_frames = 0
+
+    def write(self, frame):
+        self.file.write(np.ascontiguousarray(frame).data)
+        self.frame_shape = frame.shape
+        self.num_frames += 1
+
+    def close(self):
+        self.file.close()
+        with open(self.path + '.json', 'w') as file:
+            json.dump({'num_frames': self.num_frames,
+                       'frame_shape': [] if self.frame_shape is None else list(self.frame_shape),
+                       'dtype': 'uint8',
+                       'fps': self.fps}, file)
+
+
+class PngEpisodeWriter(object):
+    """
+    Writes the frames of an episode as a sequence of png images in a directory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.num_frames = 0
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, frame):
+        surface = pygame.surfarray.make_surface(frame.transpose(1, 0, 2))
+        pygame.image.save(surface, join(self.path, FRAME_NAME_FORMAT.format(self.num_frames)))
+        self.num_frames += 1
+
+    def close(self):
+        pass
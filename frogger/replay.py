@@ -0,0 +1,229 @@
+__author__ = 'Pedro Sequeira'
+
+import json
+import struct
+import numpy as np
+from collections import namedtuple
+from frogger.gym import *
+
+ACTION_LOG_MAGIC = b'FROGLOG1'
+
+# kwargs length, then per episode its seed, resets since seeding and number of actions
+LOG_HEADER = struct.Struct('<I')
+EPISODE_HEADER = struct.Struct('<QII')
+
+# action stored for `None` (no action) steps
+NO_ACTION = 255
+
+# seed of the random number generator until the environment is seeded, as in PLE
+DEFAULT_SEED = 24
+
+# arguments only affecting displaying, rendering or timing, not stored in action logs as replays override them
+REPLAY_IGNORED_ATTRS = {DISPLAY_SCREEN_ATTR, SOUND_ATTR, HEADLESS_ATTR, FORCE_FPS_ATTR, LOAD_ASSETS_ATTR, RECORDER_ATTR,
+                        PROFILE_ATTR}
+
+# an episode of an action log, fully determined by the environment's parameters
+RecordedEpisode = namedtuple('RecordedEpisode', ['seed', 'num_resets', 'actions'])
+
+
+class ActionRecorder(object):
+    """
+    Creates a `frogger.gym.FroggerEnv` and records its episodes in a compact binary action log. As the game's random
+    number generator is only used when initializing the game, each episode is fully determined by the environment's
+    parameters, the seed, the number of resets since seeding, and the actions' indexes, which are stored in one byte each.
+    The environment is seeded with `DEFAULT_SEED` when created, and restoring snapshots is not recorded.
+    """
+
+    def __init__(self, path, **env_kwargs):
+        """
+        Creates a new recorder and its environment.
+        :param str path: the path to the action log file, overwritten if it exists.
+        :param env_kwargs: the arguments used to create the `FroggerEnv`, those in `REPLAY_IGNORED_ATTRS` not being
+        stored and the others having to be JSON-serializable.
+        """
+        kwargs = {}
+        for name, value in env_kwargs.items():
+            if name in REPLAY_IGNORED_ATTRS:
+                continue
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError):
+                raise ValueError('Argument {} cannot be stored in the action log as it is not JSON-serializable: {!r}'
+                                 .format(name, value))
+            kwargs[name] = value
+
+        self.env = FroggerEnv(**env_kwargs)
+        if self.env.action_space.n >= NO_ACTION:
+            raise ValueError('Too many actions to be recorded: {}'.format(self.env.action_space.n))
+
+        self.file = open(path, 'wb')
+        kwargs = json.dumps(kwargs).encode()
+        self.file.write(ACTION_LOG_MAGIC + LOG_HEADER.pack(len(kwargs)) + kwargs)
+
+        self.seed_value = DEFAULT_SEED
+        self.num_resets = 0
+        self.actions = bytearray()
+        self.episode_started = False
+        self.num_episodes = 0
+        self.seed(DEFAULT_SEED)
+
+    def seed(self, seed=None):
+        self._write_episode()
+        self.seed_value = 0 if seed is None else seed
+        self.num_resets = 0
+        return self.env.seed(seed)
+
+    def reset(self):
+        self._write_episode()
+        self.num_resets += 1
+        self.episode_started = True
+        return self.env.reset()
+
+    def step(self, a):
+        self.actions.append(NO_ACTION if a is None else int(a))
+        return self.env.step(a)
+
+    def render(self, mode='human', close=False):
+        return self.env.render(mode, close)
+
+    def close(self):
+        """
+        Writes the current episode and closes the action log and the environment.
+        """
+        if self.file.closed:
+            return
+        self._write_episode()
+        self.file.close()
+        self.env.close()
+
+    def __getattr__(self, name):
+        # remaining attributes are those of the environment
+        if name == 'env':
+            raise AttributeError(name)
+        return getattr(self.env, name)
+
+    def _write_episode(self):
+        # writes the actions performed since the last reset, if the episode was started
+        if self.episode_started:
+            self.file.write(EPISODE_HEADER.pack(self.seed_value, self.num_resets, len(self.actions)))
+            self.file.write(self.actions)
+            self.num_episodes += 1
+        self.actions = bytearray()
+        self.episode_started = False
+
+
+class ActionLog(object):
+    """
+    Reads the episodes of an action log written by `ActionRecorder`.
+    """
+
+    def __init__(self, path):
+        """
+        Loads an action log, indexing its episodes.
+        :param str path: the path to the action log file.
+        """
+        with open(path, 'rb') as file:
+            data = file.read()
+        if not data.startswith(ACTION_LOG_MAGIC):
+            raise ValueError('Not a Frogger action log: {}'.format(path))
+
+        offset = len(ACTION_LOG_MAGIC)
+        kwargs_len, = LOG_HEADER.unpack_from(data, offset)
+        offset += LOG_HEADER.size
+        self.env_kwargs = json.loads(data[offset:offset + kwargs_len].decode())
+        offset += kwargs_len
+
+        self.data = data
+        self.offsets = []
+        while offset < len(data):
+            self.offsets.append(offset)
+            offset += EPISODE_HEADER.size + EPISODE_HEADER.unpack_from(data, offset)[2]
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, idx):
+        """
+        Gets an episode of the log.
+        :param int idx: the index of the episode.
+        :rtype: RecordedEpisode
+        :return: the episode, whose actions are a `uint8` array of action indexes, `NO_ACTION` standing for `None`.
+        """
+        offset = self.offsets[idx]
+        seed, num_resets, num_actions = EPISODE_HEADER.unpack_from(self.data, offset)
+        offset += EPISODE_HEADER.size
+        actions = np.frombuffer(self.data, dtype=np.uint8, count=num_actions, offset=offset)
+        return RecordedEpisode(seed, num_resets, actions)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class EpisodeReplayer(object):
+    """
+    Re-simulates the episodes of an action log without displaying, rendering or waiting between frames.
+    """
+
+    def __init__(self, env_kwargs, load_assets=None):
+        """
+        Creates a new replayer and its environment.
+        :param dict env_kwargs: the arguments used to create the recorded environment, e.g., `ActionLog.env_kwargs`.
+        :param bool load_assets: whether to load the game's assets, required to render frames, `None` only loading them
+        once frames are rendered.
+        """
+        self.env_kwargs = dict(env_kwargs)
+        self.load_assets = load_assets
+        self.env = self._create_env(bool(load_assets))
+
+    def replay(self, episode, num_steps=None):
+        """
+        Replays an episode up to a given step, leaving the environment in that step's state.
+        :param RecordedEpisode episode: the episode to be replayed.
+        :param int num_steps: the number of actions to be replayed, `None` replaying all of them.
+        :return tuple: the observation after the last replayed action, the total reward and whether the game is over.
+        """
+        obs = self._reset(episode)
+        total_reward = 0.
+        done = False
+        for a in episode.actions[:num_steps]:
+            obs, reward, done, _ = self.env.step(None if a == NO_ACTION else a)
+            total_reward += reward
+        return obs, total_reward, done
+
+    def render_frames(self, episode, steps):
+        """
+        Replays an episode, only rendering the frames after the given steps.
+        :param RecordedEpisode episode: the episode to be replayed.
+        :param list steps: the steps after which to render, `0` being the frame after the reset.
+        :return: a generator of (step, frame) tuples, frames being arrays of shape (HEIGHT, WIDTH, 3).
+        """
+        steps = sorted(set(steps))
+        if len(steps) == 0:
+            return
+        if not self.env.game_state.game.load_assets:
+            if self.load_assets is not None:
+                raise ValueError('Rendering frames requires loading assets')
+            self.env = self._create_env(True)
+        self._reset(episode)
+        step = 0
+        for target in steps:
+            for a in episode.actions[step:target]:
+                self.env.step(None if a == NO_ACTION else a)
+            step = max(step, target)
+            yield target, self.env.render('rgb_array')
+
+    def _create_env(self, load_assets):
+        kwargs = dict(self.env_kwargs)
+        kwargs.update(display_screen=False, sound=False, headless=True, force_fps=False, load_assets=load_assets,
+                      recorder=None, profile=False)
+        if not load_assets and kwargs.get(OBS_TYPE_ATTR) == PIXELS_OBS_TYPE:
+            kwargs[OBS_TYPE_ATTR] = FIXED_OBS_TYPE
+        return FroggerEnv(**kwargs)
+
+    def _reset(self, episode):
+        # recreates the random state at the start of the episode
+        self.env.seed(episode.seed)
+        for _ in range(episode.num_resets - 1):
+            self.env.game_state.reset_game()
+        return self.env.reset()
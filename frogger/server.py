@@ -0,0 +1,252 @@
+__author__ = 'Pedro Sequeira'
+
+import sys
+import socket
+import struct
+import asyncio
+import argparse
+import numpy as np
+from frogger.vector import FroggerVectorEnv
+
+STEP_CMD = 0
+RESET_CMD = 1
+
+# sent to each client when connected: its game index, the observations' size and the number of actions
+HELLO = struct.Struct('<III')
+
+# client requests: the command and the index of the action to be executed
+REQUEST = struct.Struct('<BB')
+
+# server replies: the reward and terminal flag, followed by the fixed-size observation as float64 values
+REPLY_HEADER = struct.Struct('<d?')
+
+# seconds the server waits for all connected clients' requests before stepping the games already requested
+DEFAULT_MAX_WAIT = 0.002
+
+
+class FroggerServer(object):
+    """
+    Hosts several Frogger games simulated by a `frogger.vector.FroggerVectorEnv` and serves them to clients connected
+    through a Unix or TCP socket, each client being assigned one game. An asyncio event loop collects the clients' step
+    and reset requests, running them as one batched step once all connected clients sent a request or the maximum wait
+    expired, such that games are advanced together by the vectorized simulator.
+    Replies are compact binary messages with the reward, terminal flag and the observation encoded as in
+    `FroggerState.to_fixed_observation`. Games are not automatically reset, clients having to request resets.
+    """
+
+    def __init__(self, num_envs, max_wait=DEFAULT_MAX_WAIT, seed=None, **env_kwargs):
+        """
+        Creates a new server and its games.
+        :param int num_envs: the number of games, i.e., the maximum number of clients connected at the same time.
+        :param float max_wait: the seconds to wait for requests from all connected clients after the first request of a
+        batch is received.
+        :param int seed: the seed from which the games' random number generators are spawned, such that each game's
+        episodes do not depend on the requests batched with its own.
+        :param env_kwargs: the arguments used to create the `FroggerVectorEnv`, e.g., `speed`, `level` or `max_steps`.
+        """
+        self.env = FroggerVectorEnv(num_envs, auto_reset=False, seed=seed, **env_kwargs)
+        self.max_wait = max_wait
+        self.num_batches = 0
+        self.num_requests = 0
+
+        self._writers = {}
+        self._pending = {}
+        self._actions = np.zeros(num_envs, dtype=np.int64)
+        self._step_mask = np.zeros(num_envs, dtype=bool)
+        self._reset_mask = np.zeros(num_envs, dtype=bool)
+        self._no_rewards = np.zeros(num_envs)
+        self._has_requests = None
+        self._all_requests = None
+
+    async def serve(self, address):
+        """
+        Serves the games until cancelled.
+        :param address: the path of the Unix socket, or the (host, port) tuple of the TCP socket, in which to listen.
+        """
+        self._has_requests = asyncio.Event()
+        self._all_requests = asyncio.Event()
+        if isinstance(address, str):
+            server = await asyncio.start_unix_server(self._handle_client, address)
+        else:
+            server = await asyncio.start_server(self._handle_client, *address)
+        batches = asyncio.ensure_future(self._run_batches())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batches.cancel()
+
+    def run(self, address):
+        """
+        Serves the games in a new event loop, blocking until interrupted.
+        :param address: the path of the Unix socket, or the (host, port) tuple of the TCP socket, in which to listen.
+        """
+        try:
+            asyncio.run(self.serve(address))
+        except KeyboardInterrupt:
+            pass
+
+    async def _handle_client(self, reader, writer):
+        # assigns the first free game to the client
+        free = [i for i in range(self.env.num_envs) if i not in self._writers]
+        if len(free) == 0:
+            writer.close()
+            return
+        idx = free[0]
+        self._writers[idx] = writer
+        sock = writer.get_extra_info('socket')
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        writer.write(HELLO.pack(idx, self.env.obs_size, len(self.env.action_set)))
+
+        try:
+            while True:
+                cmd, action = REQUEST.unpack(await reader.readexactly(REQUEST.size))
+                if cmd not in (STEP_CMD, RESET_CMD) or action >= len(self.env.action_set):
+                    break
+                self._pending[idx] = (cmd, action)
+                self._has_requests.set()
+                self._check_all_requests()
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            del self._writers[idx]
+            self._pending.pop(idx, None)
+            self._check_all_requests()
+            writer.close()
+
+    def _check_all_requests(self):
+        if len(self._pending) > 0 and len(self._pending) >= len(self._writers):
+            self._all_requests.set()
+
+    async def _run_batches(self):
+        while True:
+            await self._has_requests.wait()
+            if not self._all_requests.is_set() and self.max_wait > 0:
+                try:
+                    await asyncio.wait_for(self._all_requests.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+            self._has_requests.clear()
+            self._all_requests.clear()
+            if len(self._pending) > 0:
+                self._run_batch()
+
+    def _run_batch(self):
+        pending, self._pending = self._pending, {}
+        self._step_mask[:] = False
+        self._reset_mask[:] = False
+        for idx, (cmd, action) in pending.items():
+            if cmd == RESET_CMD:
+                self._reset_mask[idx] = True
+            else:
+                self._step_mask[idx] = True
+                self._actions[idx] = action
+
+        # resets and steps the requested games, each game having at most one request per batch
+        rewards = self._no_rewards
+        if self._reset_mask.any():
+            obs = self.env.reset(self._reset_mask)
+        if self._step_mask.any():
+            obs, rewards, _, _ = self.env.step(self._actions, self._step_mask)
+        dones = self.env.game_over()
+
+        for idx in pending.keys():
+            self._writers[idx].write(REPLY_HEADER.pack(rewards[idx], dones[idx]) + obs[idx].tobytes())
+        self.num_batches += 1
+        self.num_requests += len(pending)
+
+
+class FroggerClient(object):
+    """
+    Steps a game hosted by a `FroggerServer`, with an interface similar to that of `frogger.gym.FroggerEnv` using
+    fixed-size observations. Uses plain blocking sockets, not requiring an event loop nor PyGame.
+    """
+
+    def __init__(self, address, timeout=None):
+        """
+        Connects to a server, which assigns a game to this client.
+        :param address: the path of the server's Unix socket, or the (host, port) tuple of its TCP socket.
+        :param float timeout: the seconds to wait for each reply, `None` to wait indefinitely.
+        """
+        if isinstance(address, str):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.settimeout(timeout)
+        self.sock.connect(address)
+
+        hello = bytearray(HELLO.size)
+        self._recv_into(memoryview(hello))
+        self.game_idx, self.obs_size, self.num_actions = HELLO.unpack(hello)
+
+        # reply buffer, the observation being a view reused across steps
+        self._reply = bytearray(REPLY_HEADER.size + self.obs_size * 8)
+        self._reply_view = memoryview(self._reply)
+        self._obs = np.frombuffer(self._reply, dtype=np.float64, offset=REPLY_HEADER.size)
+
+    def reset(self):
+        """
+        Resets the game.
+        :return np.ndarray: the observation, stored in a buffer reused across steps.
+        """
+        return self._request(RESET_CMD, 0)[0]
+
+    def step(self, a):
+        """
+        Performs an action in the game.
+        :param int a: the index of the action (in the server's action set) to be executed.
+        :return tuple: the observation, stored in a buffer reused across steps, the reward, whether the game is over, and
+        an empty info dictionary.
+        """
+        obs, reward, done = self._request(STEP_CMD, a)
+        return obs, reward, done, {}
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _request(self, cmd, action):
+        self.sock.sendall(REQUEST.pack(cmd, action))
+        self._recv_into(self._reply_view)
+        reward, done = REPLY_HEADER.unpack_from(self._reply)
+        return self._obs, reward, done
+
+    def _recv_into(self, view):
+        received = 0
+        while received < len(view):
+            num = self.sock.recv_into(view[received:])
+            if num == 0:
+                raise ConnectionError('Connection closed by the Frogger server')
+            received += num
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Serves headless Frogger games to clients over a local socket.')
+    parser.add_argument('--unix', help='the path of the Unix socket in which to listen')
+    parser.add_argument('--host', default='127.0.0.1', help='the host of the TCP socket, if no Unix socket is given')
+    parser.add_argument('--port', type=int, default=5555, help='the port of the TCP socket')
+    parser.add_argument('--num-envs', type=int, default=64, help='the number of games')
+    parser.add_argument('--max-wait', type=float, default=DEFAULT_MAX_WAIT,
+                        help='the seconds to wait for all clients\' requests before stepping')
+    parser.add_argument('--speed', type=int, default=3, help='the initial speed of the games')
+    parser.add_argument('--level', type=int, default=1, help='the initial level of the games')
+    parser.add_argument('--max-steps', type=int, default=1000, help='the maximum number of actions per frog')
+    parser.add_argument('--seed', type=int, help='the seed of the games\' random number generators')
+    args = parser.parse_args(args)
+
+    server = FroggerServer(args.num_envs, args.max_wait, args.seed, speed=args.speed, level=args.level,
+                           max_steps=args.max_steps)
+    server.run(args.unix if args.unix is not None else (args.host, args.port))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
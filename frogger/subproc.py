@@ -0,0 +1,194 @@
+__author__ = 'Pedro Sequeira'
+
+import os
+import traceback
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from frogger import *
+
+STEP_CMD = 'step'
+RESET_CMD = 'reset'
+CLOSE_CMD = 'close'
+
+# arguments of the games' environments set by the workers, which cannot be given
+WORKER_ENV_ATTRS = ('display_screen', 'sound', 'headless', 'load_assets', 'obs_type', 'copy_obs')
+
+
+def _get_shared_specs(num_envs, obs_size):
+    # shapes and types of the actions, observations, final observations, rewards and terminal flags arrays
+    return [((num_envs,), np.int64),
+            ((num_envs, obs_size), np.float64),
+            ((num_envs, obs_size), np.float64),
+            ((num_envs,), np.float64),
+            ((num_envs,), np.bool_)]
+
+
+def _get_shared_arrays(shms, num_envs, obs_size):
+    return [np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            for shm, (shape, dtype) in zip(shms, _get_shared_specs(num_envs, obs_size))]
+
+
+def _worker(pipe, start, end, shm_names, num_envs, obs_size, env_kwargs, seed):
+    """
+    Runs the games with indexes in [start, end), writing their observations, rewards and terminal flags straight into the
+    shared arrays, and automatically resetting the games that are over.
+    """
+    from frogger.gym import FroggerEnv, FIXED_OBS_TYPE
+
+    shms = [shared_memory.SharedMemory(name=name) for name in shm_names]
+    try:
+        actions, obs, final_obs, rewards, dones = _get_shared_arrays(shms, num_envs, obs_size)
+
+        envs = []
+        for i in range(start, end):
+            env = FroggerEnv(display_screen=False, sound=False, headless=True, load_assets=False, obs_type=FIXED_OBS_TYPE,
+                             copy_obs=False, **env_kwargs)
+            env.game_state.game.set_fixed_obs_buffer(obs[i])
+            env.seed(seed + i)
+            envs.append(env)
+        pipe.send(None)
+
+        while True:
+            cmd = pipe.recv()
+            if cmd == STEP_CMD:
+                for i, env in enumerate(envs, start):
+                    _, rewards[i], dones[i], _ = env.step(actions[i])
+                    if dones[i]:
+                        final_obs[i] = obs[i]
+                        env.reset()
+            elif cmd == RESET_CMD:
+                for env in envs:
+                    env.reset()
+            elif cmd == CLOSE_CMD:
+                break
+            pipe.send(None)
+
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        pipe.send(traceback.format_exc())
+
+
+class FroggerSubprocVectorEnv(object):
+    """
+    Runs several `frogger.gym.FroggerEnv` games, created without loading assets, split among worker processes. Actions,
+    observations, rewards and terminal flags are exchanged through shared memory arrays, pipes only being used to
+    synchronize the workers.
+    Games are automatically reset when over and observations are encoded as in `FroggerState.to_fixed_observation`.
+    """
+
+    def __init__(self, num_envs, num_workers=None, seed=None, start_method=None, **env_kwargs):
+        """
+        Creates a new subprocess vectorized Frogger environment.
+        :param int num_envs: the number of games.
+        :param int num_workers: the number of worker processes, each running a contiguous chunk of the games. `None`
+        uses one worker per CPU.
+        :param int seed: the seed of the first game, the other games being seeded with consecutive seeds.
+        :param str start_method: the multiprocessing start method, `None` for the platform's default.
+        :param env_kwargs: the arguments used to create each `FroggerEnv`, e.g., `speed`, `level` or `max_steps`, except
+        those in `WORKER_ENV_ATTRS`.
+        """
+        worker_attrs = [name for name in WORKER_ENV_ATTRS if name in env_kwargs]
+        if len(worker_attrs) > 0:
+            raise ValueError('Arguments set by the workers cannot be given: {}'.format(', '.join(worker_attrs)))
+        if num_workers is None:
+            num_workers = os.cpu_count()
+        num_workers = max(1, min(num_workers, num_envs))
+
+        self.num_envs = num_envs
+        self.num_workers = num_workers
+        cars_capacity, logs_capacity = get_lanes_capacity(env_kwargs.get('speed', 3), env_kwargs.get('level', 1))
+        self.obs_size = get_fixed_obs_size(cars_capacity, logs_capacity)
+
+        self._shms = []
+        for shape, dtype in _get_shared_specs(num_envs, self.obs_size):
+            self._shms.append(shared_memory.SharedMemory(
+                create=True, size=max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)))
+        self._actions, self._obs, self._final_obs, self._rewards, self._dones = \
+            _get_shared_arrays(self._shms, num_envs, self.obs_size)
+
+        # splits games in contiguous chunks
+        ctx = mp.get_context(start_method)
+        bounds = np.linspace(0, num_envs, num_workers + 1).astype(int)
+        seed = 0 if seed is None else seed
+        self._pipes = []
+        self._processes = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            parent_pipe, child_pipe = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker, daemon=True,
+                args=(child_pipe, int(start), int(end), [shm.name for shm in self._shms],
+                      num_envs, self.obs_size, env_kwargs, seed))
+            process.start()
+            child_pipe.close()
+            self._pipes.append(parent_pipe)
+            self._processes.append(process)
+        self.closed = False
+        self._wait()
+
+    def reset(self):
+        """
+        Resets all the games.
+        :return np.ndarray: the observations of shape (num_envs, obs_size), stored in a shared buffer reused across steps.
+        """
+        self._send(RESET_CMD)
+        return self._obs
+
+    def step(self, actions):
+        """
+        Performs one action in each of the games.
+        :param np.ndarray actions: the index of the action (in the action set) to be executed in each game.
+        :return tuple: the observations, stored in a shared buffer reused across steps, the rewards and terminal flags of
+        each game, and an info dictionary with the last observation of the games that were automatically reset, if any.
+        """
+        self._actions[:] = actions
+        self._send(STEP_CMD)
+
+        rewards = self._rewards.copy()
+        dones = self._dones.copy()
+        info = {}
+        if dones.any():
+            final_obs = self._obs.copy()
+            final_obs[dones] = self._final_obs[dones]
+            info['final_observation'] = final_obs
+        return self._obs, rewards, dones, info
+
+    def close(self):
+        """
+        Stops the workers and releases the shared memory.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        for pipe, process in zip(self._pipes, self._processes):
+            try:
+                pipe.send(CLOSE_CMD)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join()
+        del self._actions, self._obs, self._final_obs, self._rewards, self._dones
+        for shm in self._shms:
+            shm.unlink()
+            try:
+                shm.close()
+            except BufferError:
+                pass  # arrays returned by the environment still reference the memory, released with them
+
+    def __del__(self):
+        if hasattr(self, 'closed'):
+            self.close()
+
+    def _send(self, cmd):
+        for pipe in self._pipes:
+            pipe.send(cmd)
+        self._wait()
+
+    def _wait(self):
+        # waits for all workers to finish, re-raising their errors
+        errors = [pipe.recv() for pipe in self._pipes]
+        errors = [error for error in errors if error is not None]
+        if len(errors) > 0:
+            self.close()
+            raise RuntimeError('Error in Frogger worker:\n{}'.format(errors[0]))
@@ -0,0 +1,125 @@
+__author__ = 'Pedro Sequeira'
+
+import numpy as np
+from frogger import *
+
+
+class LaneForecast(object):
+    """
+    Forecasts the positions of the objects of a lane over the next ticks. Row `k` of the arrays corresponds to the lane
+    after `k` ticks, i.e., where collisions are checked during the `k`-th next tick, row `0` being the current lane.
+    """
+
+    def __init__(self, lane, ticks, init_ticks, speed, level, horizon):
+        """
+        Creates a new forecast of a lane.
+        :param frogger.ple.Lane lane: the lane.
+        :param float ticks: the current value of the lane's spawn counter.
+        :param int init_ticks: the lane's initial number of ticks between spawns.
+        :param int speed: the game speed.
+        :param int level: the game level.
+        :param int horizon: the number of ticks ahead.
+        """
+        self.y = lane.y
+        self.width = lane.width
+        self.height = lane.height
+        self.row = get_grid_row(lane.y, lane.height)
+
+        # objects move by a constant amount per tick, spawned objects moving in the tick they are spawned
+        k = np.arange(horizon + 1)[:, None]
+        dx = lane.dx * speed
+        spawn_ticks = get_spawn_ticks(ticks, init_ticks, speed, level, horizon)
+        x = np.concatenate([lane.get_xs()[None, :] + dx * k,
+                            lane.init_x + dx * (k - spawn_ticks[None, :] + 1)], axis=1)
+        spawned = np.concatenate([np.zeros(lane.count, dtype=np.int64), spawn_ticks])
+
+        # objects are removed once out of bounds, positions being truncated as in `pygame.Rect`
+        self.valid = (k >= spawned[None, :]) & (lane.min_x <= x) & (x <= lane.max_x)
+        self.x = np.trunc(x)
+
+        # cells overlapped by the objects, as in the grid observations
+        first = self.x // CELL_WIDTH
+        last = (self.x + (self.width - 1)) // CELL_WIDTH
+        self.cells = ((GRID_COLS >= first[:, :, None]) & (GRID_COLS <= last[:, :, None]) &
+                      self.valid[:, :, None]).any(axis=1)
+
+    def get_intervals(self, tick):
+        """
+        Gets the horizontal intervals occupied by the lane's objects after the given number of ticks.
+        :param int tick: the number of ticks ahead.
+        :return np.ndarray: an array of shape (num_objects, 2) with the [start, end) of each interval.
+        """
+        x = self.x[tick, self.valid[tick]]
+        return np.stack([x, x + self.width], axis=1)
+
+    def collide(self, tick, rect_x, rect_y, size=FROG_SIZE):
+        """
+        Checks whether a square collides with any of the lane's objects after the given number of ticks, as
+        `frogger.ple.Lane.collide` does.
+        :param int tick: the number of ticks ahead.
+        :param int rect_x: the horizontal position of the square.
+        :param int rect_y: the vertical position of the square.
+        :param int size: the size of the square.
+        :return bool: whether the square collides with an object.
+        """
+        if not (rect_y < self.y + self.height and self.y < rect_y + size):
+            return False
+        x = self.x[tick]
+        return bool(((rect_x < x + self.width) & (x < rect_x + size) & self.valid[tick]).any())
+
+
+class TrafficForecast(object):
+    """
+    Forecasts the cars and logs of a Frogger game over the next ticks without stepping the game. As objects move by a
+    constant amount per tick and are spawned periodically, their positions are computed in closed form from the lanes'
+    current objects and spawn counters.
+    Forecasts assume the game's speed and level do not change, i.e., they are valid until the next level.
+    """
+
+    def __init__(self, game, horizon):
+        """
+        Creates a new forecast of the game's traffic.
+        :param frogger.ple.Frogger game: the game.
+        :param int horizon: the number of ticks ahead, each action corresponding to `ANIMATIONS_PER_MOVE` ticks.
+        """
+        speed = game.game.speed
+        level = game.game.level
+        self.horizon = horizon
+        self.cars = [LaneForecast(lane, game.ticks_cars[i], CARS_INIT_TICKS[i], speed, level, horizon)
+                     for i, lane in enumerate(game.car_lanes)]
+        self.logs = [LaneForecast(lane, game.ticks_logs[i], LOGS_INIT_TICKS[i], speed, level, horizon)
+                     for i, lane in enumerate(game.log_lanes)]
+
+        # cells of each lane and tick covered by cars or logs, of shape (horizon + 1, NUM_LANES, NUM_COLS)
+        self.car_cells = np.stack([lane.cells for lane in self.cars], axis=1)
+        self.log_cells = np.stack([lane.cells for lane in self.logs], axis=1)
+
+    @property
+    def safe_road_cells(self):
+        """
+        Gets the cells of the road not covered by cars.
+        :return np.ndarray: a boolean array of shape (horizon + 1, NUM_LANES, NUM_COLS).
+        """
+        return ~self.car_cells
+
+    def hits_car(self, tick, rect_x, rect_y, size=FROG_SIZE):
+        """
+        Checks whether a frog at the given position would be hit by a car after the given number of ticks.
+        :param int tick: the number of ticks ahead.
+        :param int rect_x: the (truncated) horizontal position of the frog.
+        :param int rect_y: the (truncated) vertical position of the frog.
+        :param int size: the size of the frog.
+        :return bool: whether the frog collides with a car.
+        """
+        return any(lane.collide(tick, rect_x, rect_y, size) for lane in self.cars)
+
+    def on_log(self, tick, rect_x, rect_y, size=FROG_SIZE):
+        """
+        Checks whether a frog at the given position would land on a log after the given number of ticks.
+        :param int tick: the number of ticks ahead.
+        :param int rect_x: the (truncated) horizontal position of the frog.
+        :param int rect_y: the (truncated) vertical position of the frog.
+        :param int size: the size of the frog.
+        :return bool: whether the frog collides with a log.
+        """
+        return any(lane.collide(tick, rect_x, rect_y, size) for lane in self.logs)
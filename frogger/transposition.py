@@ -0,0 +1,73 @@
+__author__ = 'Pedro Sequeira'
+
+from collections import OrderedDict
+
+DEFAULT_MAX_SIZE = 1000000
+
+
+class TranspositionTable(object):
+    """
+    Caches values, e.g., Q-values or search results, by game position keys such as those given by
+    `frogger.ple.Frogger.get_state_key`, discarding the least recently used entries when full.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        """
+        Creates a new empty table.
+        :param int max_size: the maximum number of entries in the table.
+        """
+        if max_size < 1:
+            raise ValueError('Maximum size of the table has to be positive: {}'.format(max_size))
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, default=None):
+        """
+        Gets the value stored for a key, marking it as the most recently used.
+        :param tuple key: the key.
+        :param default: the value returned if the key is not in the table.
+        :return: the value stored for the key, or `default` if there is none.
+        """
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Stores a value for a key, discarding the least recently used entry if the table is full.
+        :param tuple key: the key.
+        :param value: the value.
+        """
+        entries = self._entries
+        if key in entries:
+            entries.move_to_end(key)
+        elif len(entries) >= self.max_size:
+            entries.popitem(last=False)
+        entries[key] = value
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __getitem__(self, key):
+        value = self.get(key, self)
+        if value is self:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
@@ -0,0 +1,470 @@
+__author__ = 'Pedro Sequeira'
+
+import numpy as np
+from frogger import *
+
+NO_MOVE_DIR = -1
+UP_DIR = 0
+DOWN_DIR = 1
+LEFT_DIR = 2
+RIGHT_DIR = 3
+DIR_KEYS = [ACTION_UP_KEY, ACTION_DOWN_KEY, ACTION_LEFT_KEY, ACTION_RIGHT_KEY]
+
+
+class LaneArrays(object):
+    """
+    Stores the objects (cars or logs) of several games as per-lane ring buffers of fixed capacity. Objects in a lane all
+    move at the same speed so they are despawned in the order they were spawned.
+    """
+
+    def __init__(self, num_envs, capacity, init_pos, sizes, speed_factors, min_x, max_x):
+        """
+        Creates new empty lanes for the given number of games.
+        :param int num_envs: the number of games.
+        :param int capacity: the maximum number of objects per lane.
+        :param list init_pos: the initial position of the objects of each lane.
+        :param list sizes: the width and height of the objects of each lane.
+        :param list speed_factors: the factor multiplying the game speed for each lane.
+        :param int min_x: the minimal horizontal position of an object before being despawned.
+        :param int max_x: the maximal horizontal position of an object before being despawned.
+        """
+        self.capacity = capacity
+        self.min_x = min_x
+        self.max_x = max_x
+        self.init_x = np.array([pos[0] for pos in init_pos], dtype=np.float64)
+        self.ys = np.array([pos[1] for pos in init_pos], dtype=np.float64)
+        self.widths = np.array([size[0] for size in sizes], dtype=np.float64)
+        self.heights = np.array([size[1] for size in sizes], dtype=np.float64)
+        self.ways = np.array([ACTION_RIGHT_KEY if i % 2 == 0 else ACTION_LEFT_KEY for i in range(NUM_LANES)])
+        self.dirs = np.array([1. if i % 2 == 0 else -1. for i in range(NUM_LANES)])
+        self.dx = self.dirs * np.array(speed_factors, dtype=np.float64)
+        self._static_infos = np.repeat(
+            np.stack([self.ys, self.widths, self.heights, self.ways], axis=1)[:, None, :], capacity, axis=1)
+
+        self.x = np.zeros((num_envs, NUM_LANES, capacity))
+        self.seq = np.zeros((num_envs, NUM_LANES, capacity), dtype=np.int64)
+        self.head = np.zeros((num_envs, NUM_LANES), dtype=np.int64)
+        self.count = np.zeros((num_envs, NUM_LANES), dtype=np.int64)
+
+        self._env_idxs = np.arange(num_envs)[:, None]
+        self._lane_idxs = np.arange(NUM_LANES)[None, :]
+        self._slots = np.arange(capacity)
+
+    def clear(self, mask):
+        self.head[mask] = 0
+        self.count[mask] = 0
+
+    def spawn(self, mask, ticks):
+        # appends a new object at the tail of the masked lanes
+        env_idxs, lane_idxs = np.nonzero(mask)
+        slots = (self.head[env_idxs, lane_idxs] + self.count[env_idxs, lane_idxs]) % self.capacity
+        self.x[env_idxs, lane_idxs, slots] = self.init_x[lane_idxs]
+        self.seq[env_idxs, lane_idxs, slots] = ticks[env_idxs] * NUM_LANES + lane_idxs
+        self.count[env_idxs, lane_idxs] += 1
+
+    def move(self, speed):
+        self.x += speed[:, None, None] * self.dx[None, :, None]
+
+    def despawn(self):
+        """
+        Removes the objects that went out of bounds, which can only be found at the head of the lanes.
+        :return list: a list of (envs, lanes, slots) index arrays of the removed objects.
+        """
+        removed = []
+        while True:
+            head_x = self.x[self._env_idxs, self._lane_idxs, self.head]
+            out = (self.count > 0) & ((head_x < self.min_x) | (head_x > self.max_x))
+            if not out.any():
+                return removed
+            env_idxs, lane_idxs = np.nonzero(out)
+            removed.append((env_idxs, lane_idxs, self.head[out]))
+            self.head[out] = (self.head[out] + 1) % self.capacity
+            self.count[out] -= 1
+
+    def valid(self, env_idxs=None):
+        """
+        Gets which slots of the lanes currently hold an object.
+        :param np.ndarray env_idxs: the indexes of the games for which to get the valid slots, `None` for all games.
+        :return np.ndarray: a boolean array of shape (num_envs, lanes, capacity).
+        """
+        head = self.head if env_idxs is None else self.head[env_idxs]
+        count = self.count if env_idxs is None else self.count[env_idxs]
+        return (self._slots[None, None, :] - head[:, :, None]) % self.capacity < count[:, :, None]
+
+    def collide(self, env_idxs, rect_x, rect_y, size):
+        """
+        Checks which objects of the given games collide with the given square, as `pygame.Rect.colliderect` does.
+        :param np.ndarray env_idxs: the indexes of the games for which to check collisions.
+        :param np.ndarray rect_x: the (truncated) horizontal position of each game's square.
+        :param np.ndarray rect_y: the (truncated) vertical position of each game's square.
+        :param int size: the size of the square.
+        :return np.ndarray: a boolean array of shape (len(env_idxs), lanes, capacity).
+        """
+        obj_x = np.trunc(self.x[env_idxs])
+        rect_x = rect_x[:, None, None]
+        rect_y = rect_y[:, None]
+        in_row = (rect_y < self.ys + self.heights) & (self.ys < rect_y + size)
+        in_col = (rect_x < obj_x + self.widths[None, :, None]) & (obj_x < rect_x + size)
+        return in_col & in_row[:, :, None] & self.valid(env_idxs)
+
+    def write_infos(self, out, mask_out):
+        """
+        Writes the [x, y, width, height, dir] info of the objects in each lane, oldest first, zeroing empty slots.
+        :param np.ndarray out: the array of shape (num_envs, lanes, capacity, 5) where to write the infos.
+        :param np.ndarray mask_out: the array of shape (num_envs, lanes, capacity) where to write slot validity.
+        """
+        order = (self.head[:, :, None] + self._slots[None, None, :]) % self.capacity
+        valid = self._slots[None, None, :] < self.count[:, :, None]
+        valid = valid.astype(np.float64)
+        np.multiply(np.take_along_axis(self.x, order, axis=2), valid, out=out[..., 0])
+        for i in range(self._static_infos.shape[-1]):
+            np.multiply(self._static_infos[None, :, :, i], valid, out=out[..., i + 1])
+        mask_out[:] = valid
+
+
+class FroggerVectorEnv(object):
+    """
+    Runs several independent Frogger games whose state is kept in struct-of-arrays NumPy buffers, advancing all of them
+    with one vectorized call per step. The game rules are the same as those of `frogger.ple.Frogger`, with each step
+    corresponding to `ANIMATIONS_PER_MOVE` game ticks like in `frogger.gym.FroggerEnv`.
+    Observations are encoded as in `FroggerState.to_fixed_observation`.
+    """
+
+    def __init__(self, num_envs, actions=None, rewards=None, lives=3, speed=3, level=1, num_arrived_frogs=5,
+                 max_steps=1000, add_noop_action=False, auto_reset=True, seed=None):
+        """
+        Creates a new vectorized Frogger environment.
+        :param int num_envs: the number of games simulated in parallel.
+        :param dict actions: the agent's actions in the form (action_name:key).
+        :param dict rewards: the agent's rewards in the form (reward_name:value).
+        :param int lives: the number of lives of the agent.
+        :param int speed: the initial speed of the games.
+        :param int level: the initial level of the games.
+        :param int num_arrived_frogs: the number of frogs that have to reach a lily for a new level.
+        :param int max_steps: the maximum number of actions to put each frog in a lily.
+        :param bool add_noop_action: whether to add a no-move action to the action set.
+        :param bool auto_reset: whether to automatically reset games as soon as they are over.
+        :param int seed: the seed from which the random number generators used to initialize each game's lanes are
+        spawned.
+        """
+        if actions is None:
+            actions = DEFAULT_ACTIONS.copy()
+        if rewards is None:
+            rewards = DEFAULT_REWARDS.copy()
+
+        self.num_envs = num_envs
+        self.actions = actions
+        self.rewards = rewards
+        self.init_lives = lives
+        self.init_speed = speed
+        self.init_level = level
+        self.num_arrived_frogs = num_arrived_frogs
+        self.max_steps = max_steps
+        self.auto_reset = auto_reset
+
+        self.action_set = list(actions.values())
+        if add_noop_action:
+            self.action_set.append(ACTION_NO_MOVE_KEY)
+        self._action_dirs = np.array([DIR_KEYS.index(key) if key in DIR_KEYS else NO_MOVE_DIR
+                                      for key in self.action_set], dtype=np.int64)
+
+        cars_capacity, logs_capacity = get_lanes_capacity(speed, level)
+        self.cars = LaneArrays(num_envs, cars_capacity, CARS_INIT_POS, CARS_SIZES, CARS_SPEED_FACTORS,
+                               CARS_MIN_X, CARS_MAX_X)
+        self.logs = LaneArrays(num_envs, logs_capacity, LOGS_INIT_POS, [LOG_SIZE] * NUM_LANES, [1] * NUM_LANES,
+                               LOGS_MIN_X, LOGS_MAX_X)
+
+        self.ticks_cars = np.zeros((num_envs, NUM_LANES))
+        self.ticks_logs = np.zeros((num_envs, NUM_LANES))
+        self.ticks = np.zeros(num_envs, dtype=np.int64)
+
+        self.frog_x = np.zeros(num_envs)
+        self.frog_y = np.zeros(num_envs)
+        self.frog_way = np.zeros(num_envs, dtype=np.int64)
+        self.key = np.zeros(num_envs, dtype=np.int64)
+        self.animation_counter = np.zeros(num_envs, dtype=np.int64)
+        self.is_moving = np.zeros(num_envs, dtype=bool)
+        self.log_lane = np.zeros(num_envs, dtype=np.int64)
+        self.log_slot = np.zeros(num_envs, dtype=np.int64)
+
+        self.lives = np.zeros(num_envs, dtype=np.int64)
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+        self.level = np.zeros(num_envs, dtype=np.int64)
+        self.speed = np.zeros(num_envs, dtype=np.int64)
+        self.points = np.zeros(num_envs)
+        self.death_idx = np.zeros(num_envs, dtype=np.int64)
+        self.arrived_frogs = np.zeros((num_envs, len(ARRIVAL_POSITIONS)), dtype=bool)
+
+        self._arrival_x = np.array(ARRIVAL_POSITIONS, dtype=np.float64)
+        self._dir_keys = np.array(DIR_KEYS)
+        self._cars_init_ticks = np.array(CARS_INIT_TICKS, dtype=np.float64)
+        self._logs_init_ticks = np.array(LOGS_INIT_TICKS, dtype=np.float64)
+
+        # observation buffer, reused across steps
+        self.cars_capacity = cars_capacity
+        self.logs_capacity = logs_capacity
+        self.obs_size = get_fixed_obs_size(cars_capacity, logs_capacity)
+        self._obs = np.zeros((num_envs, self.obs_size))
+        self._obs_views = get_fixed_obs_views(self._obs, cars_capacity, logs_capacity)
+
+        self.rngs = None
+        self.seed(seed)
+        self.reset()
+
+    def seed(self, seed=None):
+        """
+        Seeds the games, each game drawing from its own random number generator such that its episodes do not depend on
+        which other games are reset with it.
+        :param int seed: the seed from which the games' generators are spawned, `None` being the same as `0`.
+        :return list: the games' random number generators.
+        """
+        seeds = np.random.SeedSequence(0 if seed is None else seed).spawn(self.num_envs)
+        self.rngs = [np.random.RandomState(np.random.MT19937(seq)) for seq in seeds]
+        return self.rngs
+
+    def reset(self, mask=None):
+        """
+        Resets the games.
+        :param np.ndarray mask: a boolean array with the games to be reset, `None` resetting all of them.
+        :return np.ndarray: the observations of shape (num_envs, obs_size), stored in a buffer reused across steps.
+        """
+        self._reset_envs(np.ones(self.num_envs, dtype=bool) if mask is None else np.asarray(mask, dtype=bool))
+        return self._get_observations()
+
+    def game_over(self):
+        return self.lives == 0
+
+    def step(self, actions, mask=None):
+        """
+        Performs one action in each of the games.
+        :param np.ndarray actions: the index of the action (in the action set) to be executed in each game.
+        :param np.ndarray mask: a boolean array with the games to be stepped, `None` stepping all of them. Games not
+        stepped are left as they are, with a reward of `0`.
+        :return tuple: the observations, stored in a buffer reused across steps, the rewards and terminal flags of each
+        game, and an info dictionary with the last observation of the games that were automatically reset, if any.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        active = np.ones(self.num_envs, dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+        alive = active & ~self.game_over()
+        prev_points = self.points.copy()
+
+        # a new action counts as a step, as Frogger._setAction
+        self.steps[alive] -= 1
+        self.points[alive] += self._get_reward(TICK_RWD_ATTR)
+        self.death_idx[alive] = NOT_DEAD_IDX
+
+        self._tick(alive, self._action_dirs[actions])
+        for i in range(1, ANIMATIONS_PER_MOVE):
+            self._tick(active & ~self.game_over())
+
+        rewards = self.points - prev_points
+        dones = self.game_over()
+        obs = self._get_observations()
+
+        info = {}
+        if self.auto_reset and dones.any():
+            info['final_observation'] = obs.copy()
+            self._reset_envs(dones)
+            obs = self._get_observations()
+
+        return obs, rewards, dones, info
+
+    def _get_reward(self, rwd_attr):
+        return self.rewards[rwd_attr] if rwd_attr in self.rewards else 0.
+
+    def _reset_envs(self, mask):
+        for i in np.flatnonzero(mask):
+            rng = self.rngs[i]
+            self.ticks_cars[i] = rng.randint(0, MAX_CAR_TICKS, size=NUM_LANES)
+            self.ticks_logs[i] = rng.randint(0, MAX_LOG_TICK, size=NUM_LANES)
+        self.ticks[mask] = 0
+        self.cars.clear(mask)
+        self.logs.clear(mask)
+
+        self._reset_frog(mask)
+        self.frog_way[mask] = ACTION_UP_KEY
+        self.key[mask] = NO_MOVE_DIR
+
+        self.lives[mask] = self.init_lives
+        self.steps[mask] = self.max_steps
+        self.level[mask] = self.init_level
+        self.speed[mask] = self.init_speed
+        self.points[mask] = 0
+        self.death_idx[mask] = NOT_DEAD_IDX
+        self.arrived_frogs[mask] = False
+
+    def _reset_frog(self, mask):
+        self.frog_x[mask] = FROG_INIT_POS[0]
+        self.frog_y[mask] = FROG_INIT_POS[1]
+        self.animation_counter[mask] = 0
+        self.is_moving[mask] = False
+        self.log_lane[mask] = -1
+
+    def _tick(self, alive, action_dirs=None):
+        if not alive.any():
+            return
+
+        # checks 'wait for key' state
+        self.key[alive & ~self.is_moving] = NO_MOVE_DIR
+
+        # processes the agent's actions, sets new direction and locks frog movement
+        if action_dirs is not None:
+            start = alive & ~self.is_moving & (action_dirs != NO_MOVE_DIR)
+            self.key[start] = action_dirs[start]
+            self.frog_way[start] = self._dir_keys[action_dirs[start]]
+            self.is_moving[start] = True
+
+        # checks max moves
+        self._set_dead(alive & (self.steps == 0), TIME_UP_RWD_ATTR, TIME_UP_DEATH_IDX)
+
+        self._create_objects(alive)
+
+        speed = np.where(alive, self.speed, 0)
+        self.cars.move(speed)
+        self.logs.move(speed)
+
+        self._move_frog(alive, speed)
+
+        self.cars.despawn()
+        for env_idxs, lane_idxs, slots in self.logs.despawn():
+            on_log = (self.log_lane[env_idxs] == lane_idxs) & (self.log_slot[env_idxs] == slots)
+            self.log_lane[env_idxs[on_log]] = -1
+
+        self._check_frog_location(alive)
+        self._check_next_level(alive)
+
+        self.ticks[alive] += 1
+
+    def _create_objects(self, alive):
+        speed = self.speed[:, None]
+        level = self.level[:, None]
+
+        spawn = alive[:, None] & (self.ticks_cars <= 0)
+        self.ticks_cars[alive] -= 1
+        self.ticks_cars[spawn] = (self._cars_init_ticks * speed / level)[spawn]
+        self.cars.spawn(spawn, self.ticks)
+
+        spawn = alive[:, None] & (self.ticks_logs <= 0)
+        self.ticks_logs[alive] -= 1
+        self.ticks_logs[spawn] = (self._logs_init_ticks * speed / level)[spawn]
+        self.logs.spawn(spawn, self.ticks)
+
+    def _move_frog(self, alive, speed):
+
+        # checks log, update horizontal movement
+        on_log = alive & (self.log_lane >= 0)
+        self.frog_x[on_log] += speed[on_log] * self.logs.dirs[self.log_lane[on_log]]
+
+        # checks pressed key, move in corresponding direction
+        moving = alive & self.is_moving
+        y_delta = np.where(self.animation_counter == ANIMATIONS_PER_MOVE - 1, 9, 10)
+
+        up = moving & (self.key == UP_DIR) & (self.frog_y >= MIN_Y_POS)
+        self.frog_y[up] -= y_delta[up]
+        down = moving & (self.key == DOWN_DIR) & (self.frog_y <= MAX_Y_POS)
+        self.frog_y[down] = np.minimum(MAX_Y_POS, self.frog_y[down] + y_delta[down])
+        left = moving & (self.key == LEFT_DIR) & (self.frog_x > 0)
+        self.frog_x[left] = np.maximum(0, self.frog_x[left] - CELL_WIDTH / ANIMATIONS_PER_MOVE)
+        right = moving & (self.key == RIGHT_DIR) & (self.frog_x < WIDTH - CELL_WIDTH)
+        self.frog_x[right] = np.minimum(WIDTH - CELL_WIDTH, self.frog_x[right] + CELL_WIDTH / ANIMATIONS_PER_MOVE)
+
+        # animates, releasing the frog at the end of the move
+        self.animation_counter[moving] += 1
+        done = moving & (self.animation_counter == ANIMATIONS_PER_MOVE)
+        self.animation_counter[done] = 0
+        self.is_moving[done] = False
+        self.log_lane[done] = -1
+
+    def _set_dead(self, mask, rwd_attr, death_idx):
+        if not mask.any():
+            return
+
+        self.lives[mask] -= 1
+        self.points[mask] += self._get_reward(rwd_attr)
+        self.death_idx[mask] = death_idx
+
+        # checks no more lives, adds reward
+        self.points[mask & (self.lives == 0)] += self._get_reward(NO_LIVES_RWD_ATTR)
+
+        # otherwise reset frog
+        reset = mask & (self.lives != 0)
+        self.steps[reset] = self.max_steps
+        self._reset_frog(reset)
+
+    def _check_frog_location(self, alive):
+
+        # check if frog achieved final position
+        arrived = alive & (self.frog_y < MIN_Y_POS)
+        if arrived.any():
+            free = ~self.arrived_frogs & \
+                   (np.abs(self.frog_x[:, None] - self._arrival_x[None, :]) < ARRIVAL_WIDTH)
+            on_lily = arrived & free.any(axis=1)
+            self.arrived_frogs[on_lily, np.argmax(free[on_lily], axis=1)] = True
+            self._reset_frog(on_lily)
+            self.points[on_lily] += self.level[on_lily] * self._get_reward(FROG_ARRIVED_RWD_ATTR)
+
+            # otherwise put's frog back in log
+            missed = arrived & ~on_lily
+            self.frog_y[missed] = MIN_Y_POS
+            self.animation_counter[missed] = 0
+            self.is_moving[missed] = False
+
+        # if frog is crossing the road
+        on_road = alive & (MAX_GRASS_Y_POS < self.frog_y) & (self.frog_y < MAX_Y_POS)
+        if on_road.any():
+            env_idxs = np.nonzero(on_road)[0]
+            collide = self.cars.collide(
+                env_idxs, np.trunc(self.frog_x[env_idxs]), np.trunc(self.frog_y[env_idxs]), FROG_SIZE)
+            hit = np.zeros(self.num_envs, dtype=bool)
+            hit[env_idxs] = collide.any(axis=(1, 2))
+            self._set_dead(hit, HIT_CAR_RWD_ATTR, CAR_DEATH_IDX)
+
+        # if frog is in the river and not on a log, checks for collision with the earliest spawned log
+        in_river = alive & (MIN_Y_POS <= self.frog_y) & (self.frog_y < MAX_GRASS_Y_POS) & (self.log_lane < 0)
+        if in_river.any():
+            env_idxs = np.nonzero(in_river)[0]
+            collide = self.logs.collide(
+                env_idxs, np.trunc(self.frog_x[env_idxs]), np.trunc(self.frog_y[env_idxs]), FROG_SIZE)
+            found = collide.any(axis=(1, 2))
+            first = np.argmin(np.where(collide, self.logs.seq[env_idxs], np.iinfo(np.int64).max)
+                              .reshape(len(env_idxs), -1), axis=1)
+            self.log_lane[env_idxs[found]] = first[found] // self.logs.capacity
+            self.log_slot[env_idxs[found]] = first[found] % self.logs.capacity
+
+            # checks frog out-of-bounds (assume fell on water)
+            frog_x = self.frog_x[env_idxs]
+            drowned = np.zeros(self.num_envs, dtype=bool)
+            drowned[env_idxs] = ~(found & (-FROG_SIZE < frog_x) & (frog_x < WIDTH))
+            self._set_dead(drowned, HIT_WATER_RWD_ATTR, WATER_DEATH_IDX)
+
+    def _check_next_level(self, alive):
+        new_level = alive & (self.arrived_frogs.sum(axis=1) >= self.num_arrived_frogs)
+        if not new_level.any():
+            return
+
+        self.arrived_frogs[new_level] = False
+        self.frog_x[new_level] = FROG_INIT_POS[0]
+        self.frog_y[new_level] = FROG_INIT_POS[1]
+        self.steps[new_level] = self.max_steps
+        self.level[new_level] += 1
+        self.speed[new_level] += 1
+        self.points[new_level] += self.level[new_level] * self._get_reward(NEW_LEVEL_RWD_ATTR)
+
+    def _get_observations(self):
+        obs = self._obs
+        obs[:, 0] = self.steps
+        obs[:, 1] = self.level
+        obs[:, 2] = self.points
+        obs[:, 3] = self.death_idx
+        obs[:, 4] = self.lives
+        obs[:, 5:10] = self.arrived_frogs
+        obs[:, 10] = self.frog_x
+        obs[:, 11] = self.frog_y
+        obs[:, 12] = FROG_SIZE
+        obs[:, 13] = FROG_SIZE
+        obs[:, 14] = self.frog_way
+
+        cars, logs, cars_mask, logs_mask = self._obs_views
+        self.cars.write_infos(cars, cars_mask)
+        self.logs.write_infos(logs, logs_mask)
+        return obs